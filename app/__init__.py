@@ -22,26 +22,32 @@ def create_app(config_class=Config):
     # Log app creation
     app.logger.info("Creating Flask application...")
 
-    # Create upload directory immediately (without using current_app)
-    try:
-        upload_folder = app.config.get('UPLOAD_FOLDER')
-        if upload_folder:
-            os.makedirs(upload_folder, exist_ok=True)
-            app.logger.info(f"Created upload directory: {upload_folder}")
-    except Exception as e:
-        app.logger.warning(f"Could not create upload directory: {e}")
-
-    # Use filesystem for session storage to handle large session data
+    # Create upload and data directories immediately (without using current_app)
+    for folder_key in ('UPLOAD_FOLDER', 'DATA_FOLDER'):
+        try:
+            folder = app.config.get(folder_key)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+                app.logger.info(f"Created {folder_key} directory: {folder}")
+        except Exception as e:
+            app.logger.warning(f"Could not create {folder_key} directory: {e}")
+
+    # Server-side sessions; only the session ID is sent to the browser
     app.config['SESSION_TYPE'] = 'filesystem'
-    app.config['SESSION_FILE_DIR'] = tempfile.gettempdir()
+    app.config.setdefault('SESSION_FILE_DIR', os.path.join(tempfile.gettempdir(), 'flask_session'))
     app.config['SESSION_PERMANENT'] = False
     app.config['SESSION_USE_SIGNER'] = True
     app.config['SESSION_COOKIE_SECURE'] = True
     app.config['SESSION_COOKIE_HTTPONLY'] = True
     app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 
-    # Initialize Flask-Session
-    Session(app)
+    if app.config.get('SESSION_BACKEND', 'sqlite') == 'filesystem':
+        # Initialize Flask-Session
+        Session(app)
+    else:
+        # Sharded SQLite files or Redis, with expiry
+        from app.utils.session_store import create_session_interface
+        app.session_interface = create_session_interface(app)
 
     # Register blueprints
     with app.app_context():
@@ -52,6 +58,22 @@ def create_app(config_class=Config):
         app.register_blueprint(main)
         app.register_blueprint(auth, url_prefix='/auth')
 
+    # Request, session and pipeline stage timings on /metrics
+    from app.utils.metrics import register_metrics
+    register_metrics(app)
+
+    # cProfile for requests carrying PROFILING_TOKEN, and /admin/profiles
+    from app.utils.profiling import register_profiling
+    register_profiling(app)
+
+    # Periodic clean-up of uploads, derived files and sessions, and `flask janitor`
+    from app.utils.janitor import register_janitor
+    register_janitor(app)
+
+    # `flask batch` for many PDFs at once
+    from app.utils.batch import register_batch
+    register_batch(app)
+
     # Log that app creation is complete
     app.logger.info("Application created successfully")
 
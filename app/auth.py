@@ -1,8 +1,7 @@
 from flask import Blueprint, render_template, redirect, url_for, request, flash, session, jsonify, current_app
-from app.utils.google_auth import GoogleAuth
+from app.utils.google_auth import get_google_auth
 
 auth = Blueprint('auth', __name__)
-google_auth = GoogleAuth()
 
 @auth.route('/login')
 def login():
@@ -18,7 +17,7 @@ def google_login():
         # Log the BASE_URL for debugging
         current_app.logger.info(f"BASE_URL from config: {current_app.config.get('BASE_URL')}")
 
-        auth_url = google_auth.get_google_auth_url()
+        auth_url = get_google_auth().get_google_auth_url()
         current_app.logger.info(f"Generated auth URL: {auth_url}")
         return redirect(auth_url)
     except Exception as e:
@@ -78,7 +77,7 @@ def google_callback():
 
         # Exchange code for tokens
         current_app.logger.info("Exchanging code for tokens")
-        tokens = google_auth.exchange_code_for_token(code)
+        tokens = get_google_auth().exchange_code_for_token(code)
 
         if 'error' in tokens:
             error_details = tokens.get('error')
@@ -88,7 +87,7 @@ def google_callback():
 
         # Get user info using the access token
         current_app.logger.info("Getting user info")
-        user_info = google_auth.get_user_info(tokens.get('access_token'))
+        user_info = get_google_auth().get_user_info(tokens.get('access_token'))
 
         if 'error' in user_info:
             error_details = user_info.get('error')
@@ -98,7 +97,7 @@ def google_callback():
 
         # Store user data in session
         current_app.logger.info(f"Authentication successful for user: {user_info.get('email')}")
-        google_auth.store_user_session(user_info, tokens)
+        get_google_auth().store_user_session(user_info, tokens)
 
         return redirect(url_for('main.index'))
 
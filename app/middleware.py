@@ -1,5 +1,5 @@
 from functools import wraps
-from flask import session, redirect, url_for, flash, request
+from flask import session, redirect, url_for, flash, request, current_app, abort
 
 def login_required(f):
     """
@@ -12,3 +12,16 @@ def login_required(f):
             return redirect(url_for('auth.login', next=request.url))
         return f(*args, **kwargs)
     return decorated_function
+
+def admin_required(f):
+    """
+    Decorator to restrict routes to the users listed in ADMIN_EMAILS.
+    """
+    @wraps(f)
+    @login_required
+    def decorated_function(*args, **kwargs):
+        email = (session['user'].get('email') or '').lower()
+        if email not in current_app.config.get('ADMIN_EMAILS', []):
+            abort(403)
+        return f(*args, **kwargs)
+    return decorated_function
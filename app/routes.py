@@ -1,21 +1,47 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, send_file, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, send_file, current_app, Response, stream_with_context
 import os
+import json
+import time
 import uuid
 from werkzeug.utils import secure_filename
-from app.utils.pdf_processor import extract_text_from_pdf, generate_summary_pdf, create_pdf_summary
-from app.utils.quiz_generator import generate_quiz
-from app.middleware import login_required
-from app.utils.firebase_integration import FirebaseIntegration
-
-firebase = FirebaseIntegration()
+from app.utils.pdf_processor import extract_text_cached, get_summary_pdf, stream_pdf_summary
+from app.utils.disk_cache import cache_stats
+from app.utils.uploads import save_upload
+from app.utils.search_index import get_search_index, select_topic_text
+from app.utils.batch import Batch, batch_directory, create_batch, run_batch, PENDING
+from app.utils.document_store import get_document_store, QUIZ_GENERATING, QUIZ_FAILED
+from app.utils.jobs import get_job_queue, report_progress, DONE, QUEUED, RUNNING
+from app.utils.quiz_generator import (generate_quiz, generate_quiz_stream, generate_question_bank, assemble_quiz,
+                                     question_matches, tag_question, untag_question, QUESTION_COUNT)
+from app.utils.metrics import timed
+from app.middleware import login_required, admin_required
 
 main = Blueprint('main', __name__)
 
 ALLOWED_EXTENSIONS = {'pdf'}
 
+# Page to open once a background job of each kind has finished
+JOB_REDIRECTS = {
+    'summary': 'main.quiz_setup',
+    'quiz': 'main.quiz',
+}
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def current_document_id():
+    """Return the ID of the document uploaded in this session, if it still exists."""
+    document_id = session.get('document_id')
+    store = get_document_store()
+    document = store.get_document(document_id) if document_id else None
+    if not document:
+        return None
+
+    # Keep the document away from the janitor while the session uses it
+    if time.time() - (document['accessed_at'] or 0) > 60:
+        store.touch_document(document_id)
+    return document_id
+
 @main.route('/')
 def index():
     return render_template('index.html')
@@ -34,18 +60,34 @@ def upload_file():
         return redirect(request.url)
 
     if file and allowed_file(file.filename):
-        # Generate a unique filename
         original_filename = secure_filename(file.filename)
-        filename = f"{uuid.uuid4()}_{original_filename}"
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
 
-        # Extract text from PDF
-        pdf_text = extract_text_from_pdf(file_path)
+        # Store the file by content hash; identical uploads share one copy
+        with timed('upload_save'):
+            blob = save_upload(file, current_app.config['UPLOAD_FOLDER'])
+        store = get_document_store()
+
+        # Extract text from PDF, unless it was extracted for an earlier upload of the same file
+        if blob['text'] is None:
+            pdf_text, page_count = extract_text_cached(blob['path'], blob['content_hash'])
+            if not pdf_text:
+                # Not a readable PDF, or one without text: keep nothing of it
+                store.release_blob(blob['content_hash'])
+                flash('Could not extract any text from this file. Please upload a valid PDF with text.')
+                return redirect(url_for('main.index'))
+            store.set_blob_text(blob['content_hash'], pdf_text, page_count)
+            # Index the text now, so topic quizzes do not wait for it
+            get_search_index(blob['content_hash'], pdf_text)
+        else:
+            page_count = blob['page_count']
+
+        # The text stays with the blob; the session only holds the document ID
+        document_id = store.create_document(
+            session['user'].get('uid'), original_filename, blob['path'], blob['content_hash'], page_count
+        )
 
         # Store in session
-        session['pdf_path'] = file_path
-        session['pdf_text'] = pdf_text
+        session['document_id'] = document_id
         session['original_filename'] = original_filename
 
         return redirect(url_for('main.summarize'))
@@ -56,89 +98,287 @@ def upload_file():
 @main.route('/summarize')
 @login_required
 def summarize():
-    if 'pdf_text' not in session:
+    if not current_document_id():
         flash('Please upload a PDF first')
         return redirect(url_for('main.index'))
 
     return render_template('summarize.html', filename=session.get('original_filename'))
 
+# Least seconds between two progress reports of a summary job
+SUMMARY_PROGRESS_INTERVAL = 0.5
+
 @main.route('/generate-summary', methods=['POST'])
 @login_required
 def generate_summary():
-    if 'pdf_text' not in session:
+    document_id = current_document_id()
+    if not document_id:
         return jsonify({'error': 'No PDF uploaded'}), 400
 
-    pdf_text = session.get('pdf_text')
-
-    # Generate summary using Gemini API
-    summary = create_pdf_summary(pdf_text)
-
-    # Generate a PDF with the summary
-    summary_pdf_path = generate_summary_pdf(summary, session.get('original_filename'))
+    # refresh=true skips the response cache and asks the model again
+    use_cache = request.form.get('refresh', 'false').lower() != 'true'
+
+    # The Gemini call runs in the background; the page polls the job status
+    job_id = get_job_queue().submit(
+        'summary', session['user'].get('uid'), summarize_document,
+        document_id, use_cache
+    )
+
+    return jsonify({'success': True, 'job_id': job_id, 'status_url': url_for('main.job_status', job_id=job_id)}), 202
+
+def summarize_document(document_id, use_cache=True):
+    """Background job: summarize a stored document."""
+    store = get_document_store()
+    pdf_text = store.get_text(document_id)
+    if not pdf_text:
+        raise ValueError("No text could be extracted from the PDF")
+
+    # Generate summary using Gemini API, sharing the text written so far with status polls
+    pieces = []
+    reported = 0.0
+    for piece in stream_pdf_summary(pdf_text, use_cache=use_cache):
+        pieces.append(piece)
+        if time.monotonic() - reported >= SUMMARY_PROGRESS_INTERVAL:
+            report_progress({'text': "".join(pieces)})
+            reported = time.monotonic()
+    summary = "".join(pieces)
+
+    # Store with the document; the PDF is rendered when it is first downloaded
+    store.set_summary(document_id, summary)
+
+@main.route('/stream-summary')
+@login_required
+def stream_summary():
+    """
+    Generate the summary and send it to the browser as server-sent events while it is written.
+
+    The model call runs in the request, holding its worker throughout, so this
+    is only enabled with SUMMARY_SSE, for async workers. Otherwise summaries
+    are generated by the job queue (/generate-summary).
+    """
+    if not current_app.config.get('SUMMARY_SSE', False):
+        return jsonify({'error': 'Streaming summaries are disabled'}), 404
+
+    document_id = current_document_id()
+    if not document_id:
+        return jsonify({'error': 'No PDF uploaded'}), 400
 
-    # Store in session
-    session['summary'] = summary
-    session['summary_pdf_path'] = summary_pdf_path
+    use_cache = request.args.get('refresh', 'false').lower() != 'true'
+    redirect_url = url_for('main.quiz_setup')
+
+    def events():
+        store = get_document_store()
+        pieces = []
+        try:
+            for piece in stream_pdf_summary(store.get_text(document_id), use_cache=use_cache):
+                pieces.append(piece)
+                yield sse_event('chunk', {'text': piece})
+
+            # Keep the final text, as the background job does
+            store.set_summary(document_id, "".join(pieces))
+        except Exception as e:
+            current_app.logger.error(f"Error streaming summary: {e}", exc_info=True)
+            yield sse_event('error', {'error': f"Error generating summary: {str(e)}"})
+            return
+        yield sse_event('done', {'redirect': redirect_url})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
-    return jsonify({'success': True, 'redirect': url_for('main.quiz_setup')})
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 @main.route('/quiz-setup')
 @login_required
 def quiz_setup():
-    if 'summary' not in session:
+    document_id = current_document_id()
+    summary = get_document_store().get_summary(document_id) if document_id else None
+    if summary is None:
         flash('Please generate a summary first')
         return redirect(url_for('main.index'))
 
-    return render_template('quiz_setup.html', summary=session.get('summary'))
+    return render_template('quiz_setup.html', summary=summary)
 
 @main.route('/generate-quiz', methods=['POST'])
 @login_required
 def create_quiz():
-    if 'pdf_text' not in session:
+    document_id = current_document_id()
+    if not document_id:
         return jsonify({'error': 'No PDF uploaded'}), 400
 
     difficulty = request.form.get('difficulty', 'medium')
     topics = request.form.get('topics', '').split(',')
     topics = [topic.strip() for topic in topics if topic.strip()]
+    use_cache = request.form.get('refresh', 'false').lower() != 'true'
 
-    # Generate quiz questions
-    quiz = generate_quiz(session.get('pdf_text'), difficulty, topics)
+    # The Gemini call runs in the background; the page polls the job status
+    job_id = get_job_queue().submit(
+        'quiz', session['user'].get('uid'), build_quiz, document_id, difficulty, topics, use_cache
+    )
 
-    # Store in session
-    session['quiz'] = quiz
+    # Reset the quiz progress in the session
     session['current_question'] = 0
     session['answers'] = []
 
-    return jsonify({'success': True, 'redirect': url_for('main.quiz')})
+    return jsonify({'success': True, 'job_id': job_id, 'status_url': url_for('main.job_status', job_id=job_id)}), 202
+
+def build_quiz(document_id, difficulty, topics, use_cache=True):
+    """
+    Background job: set up a quiz for a stored document.
+
+    Quizzes are assembled from the document's question bank, which is
+    generated with the first quiz. The model is only asked for quiz questions
+    when the bank has too few matching the difficulty and topics, or when new
+    questions were requested; those are added to the bank as well.
+    """
+    store = get_document_store()
+    bank_size = current_app.config.get('QUESTION_BANK_SIZE', 0)
+    bank = store.get_question_bank(document_id) if bank_size else None
+
+    # Most quizzes need no model call at all
+    from_bank = assemble_quiz(bank, difficulty, topics, partial=True) if bank and use_cache else []
+    if len(from_bank) == QUESTION_COUNT:
+        store.set_quiz(document_id, from_bank)
+        return
+
+    pdf_text = store.get_text(document_id)
+    streaming = current_app.config.get('QUIZ_STREAMING', True)
+
+    # Quizzes on specific topics only send the parts of the document about them
+    quiz_text = pdf_text
+    if topics and pdf_text and current_app.config.get('TOPIC_SEARCH', True):
+        document = store.get_document(document_id)
+        quiz_text = select_topic_text(document['content_hash'] or document_id, pdf_text, topics) or pdf_text
+    questions = []
+    new_entries = []
+    # Questions of a failed bank are not kept, so the next quiz tries to build it again
+    keep_entries = bank is not None
+
+    def add_question(question):
+        questions.append(question)
+        if streaming:
+            # Store each question as soon as it has been parsed; the quiz can start after the first
+            store.append_quiz_question(document_id, question)
+            if len(questions) == 1:
+                report_progress({'ready': True})
+
+    if streaming:
+        store.start_quiz(document_id)
+    failed = True
+    try:
+        if bank_size and bank is None:
+            # First quiz of this document: build the bank, taking the quiz from it as it arrives
+            try:
+                for entry in generate_question_bank(pdf_text, bank_size, stream=streaming, use_cache=use_cache):
+                    new_entries.append(entry)
+                    keep_entries = True
+                    if len(questions) < QUESTION_COUNT and question_matches(entry, difficulty, topics):
+                        add_question(untag_question(entry))
+            except Exception as e:
+                current_app.logger.error(f"Error generating the question bank: {e}")
+
+        for question in from_bank:
+            add_question(question)
+
+        # The bank cannot satisfy this request: ask the model for the missing questions
+        missing = QUESTION_COUNT - len(questions)
+        if missing > 0:
+            # New questions were requested: do not repeat the ones the bank already has
+            exclude = [question['question'] for question in questions]
+            if bank and not use_cache:
+                exclude += [entry['question'] for entry in bank if question_matches(entry, difficulty, topics)]
+            try:
+                generate = generate_quiz_stream if streaming else generate_quiz
+                for question in generate(quiz_text, difficulty, topics, use_cache=use_cache, count=missing,
+                                         exclude=exclude):
+                    new_entries.append(tag_question(question, difficulty, topics))
+                    add_question(question)
+            except Exception as e:
+                # Keep the questions we have; without any, the job fails
+                if not questions:
+                    raise
+                current_app.logger.error(f"Error generating quiz questions: {e}")
+        failed = False
+    finally:
+        if new_entries and keep_entries:
+            store.add_to_question_bank(document_id, new_entries)
+        if failed:
+            # Without this, the empty (or earlier) quiz would look like a finished one
+            store.fail_quiz(document_id)
+        elif streaming:
+            store.finish_quiz(document_id)
+
+    if not streaming:
+        store.set_quiz(document_id, questions)
+
+@main.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """Report the status of a background job started by the current user."""
+    job = get_job_queue().get(job_id)
+    if job is None or job['owner'] != session['user'].get('uid'):
+        return jsonify({'error': 'Job not found'}), 404
+
+    response = {'job_id': job_id, 'status': job['status']}
+    if job['status'] == DONE:
+        response['redirect'] = url_for(JOB_REDIRECTS[job['kind']])
+    elif job['status'] == RUNNING and (job['progress'] or {}).get('ready'):
+        # Enough of the result exists to continue (e.g. the first quiz question)
+        response['ready'] = True
+        response['redirect'] = url_for(JOB_REDIRECTS[job['kind']])
+    elif job['status'] == RUNNING and job['progress']:
+        # Partial results, e.g. the summary text written so far
+        response['progress'] = job['progress']
+    elif job['error']:
+        response['error'] = job['error']
+    return jsonify(response)
 
 @main.route('/quiz')
 @login_required
 def quiz():
-    if 'quiz' not in session:
+    document_id = current_document_id()
+    document = get_document_store().get_document(document_id) if document_id else None
+    quiz = get_document_store().get_quiz(document_id) if document else None
+    if quiz is None:
+        if document and document['quiz_status'] == QUIZ_FAILED:
+            flash('Generating the quiz failed. Please try again.')
+            return redirect(url_for('main.quiz_setup'))
         flash('Please set up a quiz first')
         return redirect(url_for('main.index'))
 
-    quiz = session.get('quiz')
     current_q = session.get('current_question', 0)
+    generating = document['quiz_status'] == QUIZ_GENERATING
+    total_questions = max(len(quiz), QUESTION_COUNT) if generating else len(quiz)
 
     if current_q >= len(quiz):
+        if generating:
+            # The next question is still being generated; the page reloads until it arrives
+            return render_template('quiz.html', question=None, question_number=current_q+1, total_questions=total_questions)
         return redirect(url_for('main.results'))
 
     question = quiz[current_q]
-    return render_template('quiz.html', question=question, question_number=current_q+1, total_questions=len(quiz))
+    return render_template('quiz.html', question=question, question_number=current_q+1, total_questions=total_questions)
 
 @main.route('/submit-answer', methods=['POST'])
 @login_required
 def submit_answer():
-    if 'quiz' not in session:
+    document_id = current_document_id()
+    document = get_document_store().get_document(document_id) if document_id else None
+    quiz = get_document_store().get_quiz(document_id) if document else None
+    if not quiz:
+        if document and document['quiz_status'] == QUIZ_FAILED:
+            flash('Generating the quiz failed. Please try again.')
+            return jsonify({'error': 'Generating the quiz failed', 'redirect': url_for('main.quiz_setup')}), 400
         return jsonify({'error': 'No active quiz'}), 400
 
     answer = request.form.get('answer')
     current_q = session.get('current_question', 0)
-    quiz = session.get('quiz')
+    generating = document['quiz_status'] == QUIZ_GENERATING
 
     if current_q >= len(quiz):
-        return jsonify({'redirect': url_for('main.results')})
+        return jsonify({'redirect': url_for('main.quiz' if generating else 'main.results')})
 
     # Record answer
     answers = session.get('answers', [])
@@ -153,7 +393,7 @@ def submit_answer():
     # Move to next question
     session['current_question'] = current_q + 1
 
-    if current_q + 1 >= len(quiz):
+    if current_q + 1 >= len(quiz) and not generating:
         return jsonify({'redirect': url_for('main.results')})
     else:
         return jsonify({'redirect': url_for('main.quiz')})
@@ -179,12 +419,97 @@ def results():
 @main.route('/download-summary')
 @login_required
 def download_summary():
-    if 'summary_pdf_path' not in session:
+    document_id = current_document_id()
+    summary = get_document_store().get_summary(document_id) if document_id else None
+    if not summary:
         flash('No summary available to download')
         return redirect(url_for('main.index'))
 
-    return send_file(session.get('summary_pdf_path'), as_attachment=True,
-                    download_name=f"Summary_{session.get('original_filename', 'document.pdf')}")
+    # Rendered on first download and cached; repeat downloads can be answered with 304
+    original_filename = session.get('original_filename', 'document.pdf')
+    summary_pdf_path, etag = get_summary_pdf(summary, original_filename)
+    return send_file(summary_pdf_path, mimetype='application/pdf', as_attachment=True,
+                    download_name=f"Summary_{original_filename}", etag=etag, conditional=True)
+
+@main.route('/batch', methods=['POST'])
+@login_required
+def create_batch_job():
+    """Start summarizing and quizzing many PDFs at once; poll the returned status URL for the zip."""
+    files = [file for file in request.files.getlist('pdf_files') if file.filename and allowed_file(file.filename)]
+    if not files:
+        return jsonify({'error': 'No PDF files uploaded'}), 400
+
+    difficulty = request.form.get('difficulty', 'medium')
+    topics = [topic.strip() for topic in request.form.get('topics', '').split(',') if topic.strip()]
+    batch = create_batch(session['user'].get('uid'), files, difficulty, topics)
+    return start_batch(batch)
+
+def start_batch(batch):
+    batch_id = batch.manifest['id']
+    queue = get_job_queue()
+
+    def is_active(job_id):
+        job = queue.get(job_id)
+        return job is not None and job['status'] in (QUEUED, RUNNING)
+
+    # Two runs would process the same pending items and overwrite each other's manifest
+    job_id = uuid.uuid4().hex
+    if not batch.claim(job_id, is_active):
+        return jsonify({'error': 'Batch is already running'}), 409
+    queue.submit('batch', session['user'].get('uid'), run_batch, batch_id,
+                 timeout=current_app.config.get('BATCH_TIMEOUT', 24 * 60 * 60), job_id=job_id)
+    return jsonify({'success': True, 'batch_id': batch_id,
+                    'status_url': url_for('main.batch_status', batch_id=batch_id)}), 202
+
+def get_user_batch(batch_id):
+    """Return the current user's batch, or None if it does not exist or belongs to someone else."""
+    try:
+        batch = Batch(batch_directory(batch_id))
+    except (OSError, ValueError):
+        return None
+    return batch if batch.manifest['owner'] == session['user'].get('uid') else None
+
+@main.route('/batch/<batch_id>')
+@login_required
+def batch_status(batch_id):
+    """Report the progress of a batch; the zip can be downloaded once nothing is pending."""
+    batch = get_user_batch(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
+
+    counts = batch.counts()
+    response = {
+        'batch_id': batch_id,
+        'counts': counts,
+        'items': {name: {'status': item['status'], 'error': item['error']} for name, item in batch.items.items()}
+    }
+    if not counts[PENDING] and os.path.exists(batch.zip_path):
+        response['download_url'] = url_for('main.download_batch', batch_id=batch_id)
+    return jsonify(response)
+
+@main.route('/batch/<batch_id>/resume', methods=['POST'])
+@login_required
+def resume_batch(batch_id):
+    """Run an interrupted batch again, retrying the items that are not done."""
+    batch = get_user_batch(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    return start_batch(batch)
+
+@main.route('/batch/<batch_id>/download')
+@login_required
+def download_batch(batch_id):
+    batch = get_user_batch(batch_id)
+    if batch is None or not os.path.exists(batch.zip_path):
+        return jsonify({'error': 'Batch results not found'}), 404
+    return send_file(batch.zip_path, mimetype='application/zip', as_attachment=True,
+                     download_name=f"batch_{batch_id}.zip")
+
+@main.route('/cache-stats')
+@admin_required
+def cache_statistics():
+    """Report hit/miss counters of the extraction and LLM response caches for this worker process."""
+    return jsonify(cache_stats())
 
 @main.route('/reset')
 def reset():
@@ -93,3 +93,35 @@ dropAreas.forEach(area => {
         }
     }
 });
+
+// Poll a background job until it finishes, then call onDone or onError;
+// onProgress, if given, receives the partial results of a running job
+function pollJob(statusUrl, onDone, onError, interval, onProgress) {
+    interval = interval || 1000;
+
+    function check() {
+        $.ajax({
+            url: statusUrl,
+            type: "GET",
+            dataType: "json",
+            success: function(job) {
+                // A running job may already be far enough along to move on
+                if (job.status === 'done' || job.ready) {
+                    onDone(job);
+                } else if (job.status === 'failed') {
+                    onError(job.error || 'Job failed');
+                } else {
+                    if (onProgress && job.progress) {
+                        onProgress(job.progress);
+                    }
+                    setTimeout(check, interval);
+                }
+            },
+            error: function(xhr, status, error) {
+                onError(error);
+            }
+        });
+    }
+
+    check();
+}
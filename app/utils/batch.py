@@ -0,0 +1,308 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import zipfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import click
+from flask import current_app
+from werkzeug.utils import secure_filename
+from app.utils.pdf_processor import extract_text_cached, create_pdf_summary, render_summary_pdf
+from app.utils.quiz_generator import generate_quiz
+
+MANIFEST_NAME = 'manifest.json'
+ZIP_NAME = 'results.zip'
+LOCK_NAME = 'manifest.lock'
+
+# A lock file older than this was left behind by a process that died holding it
+STALE_LOCK_AGE = 60
+
+# Values of an item's status in the manifest
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Batch:
+    """Many PDFs summarized and quizzed together, with results written as they finish.
+
+    A batch is a directory: the PDFs in inputs/, a summary PDF and quiz JSON
+    per PDF in results/, and manifest.json recording the settings and the
+    status of every item. The manifest is rewritten after each item, so an
+    interrupted run is resumed by running the batch again; finished items
+    are skipped and extraction and model calls are served from the caches.
+    Web batches also record the job running them, so only one run at a time
+    processes the pending items.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        with open(os.path.join(directory, MANIFEST_NAME)) as file:
+            self.manifest = json.load(file)
+
+    @classmethod
+    def create(cls, directory, owner=None, difficulty='medium', topics=None):
+        """Create an empty batch in directory, or open the one already there."""
+        if os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+            return cls(directory)
+        os.makedirs(os.path.join(directory, 'inputs'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'results'), exist_ok=True)
+        manifest = {
+            'id': os.path.basename(os.path.normpath(directory)),
+            'owner': owner,
+            'difficulty': difficulty,
+            'topics': topics or [],
+            'created_at': time.time(),
+            'items': {}
+        }
+        _write_json(os.path.join(directory, MANIFEST_NAME), manifest)
+        return cls(directory)
+
+    @property
+    def items(self):
+        return self.manifest['items']
+
+    def save(self):
+        with self._lock:
+            _write_json(os.path.join(self.directory, MANIFEST_NAME), self.manifest)
+
+    def add_pdf(self, filename, source):
+        """
+        Add a PDF to the batch.
+
+        Args:
+            filename (str): Original file name
+            source: Path of the PDF, or a file object to copy it from
+
+        Returns:
+            str: The item name, unique within the batch
+        """
+        stem = os.path.splitext(secure_filename(os.path.basename(filename)) or 'document.pdf')[0] or 'document'
+        name = stem
+        suffix = 2
+        while name in self.items:
+            name = f"{stem}-{suffix}"
+            suffix += 1
+
+        path = os.path.join(self.directory, 'inputs', name + '.pdf')
+        item = {'filename': os.path.basename(filename), 'status': PENDING, 'error': None}
+        if isinstance(source, str):
+            shutil.copyfile(source, path)
+            item['source'] = os.path.abspath(source)
+        else:
+            with open(path, 'wb') as out:
+                shutil.copyfileobj(source, out)
+        self.items[name] = item
+        return name
+
+    def claim(self, job_id, is_active):
+        """
+        Record job_id as the job running the batch, unless the job recorded before is still active.
+
+        Args:
+            job_id (str): ID of the job about to run the batch
+            is_active (callable): Tells from a job ID whether that job is queued or running
+
+        Returns:
+            bool: Whether the batch was claimed for job_id
+        """
+        with _file_lock(os.path.join(self.directory, LOCK_NAME)):
+            # Another request may have claimed the batch since it was opened
+            with open(os.path.join(self.directory, MANIFEST_NAME)) as file:
+                self.manifest = json.load(file)
+            active = self.manifest.get('job_id')
+            if active and is_active(active):
+                return False
+            self.manifest['job_id'] = job_id
+            self.save()
+        return True
+
+    def pending(self):
+        """Return the names of the items that have not been processed successfully."""
+        return [name for name, item in self.items.items() if item['status'] != DONE]
+
+    def _process(self, name):
+        """Extract, summarize and quiz one PDF, writing its results."""
+        item = self.items[name]
+        pdf_text, page_count = extract_text_cached(os.path.join(self.directory, 'inputs', name + '.pdf'))
+        if not pdf_text:
+            raise ValueError("No text could be extracted from the PDF")
+
+        summary = create_pdf_summary(pdf_text)
+        if summary.startswith("Error generating summary"):
+            raise RuntimeError(summary)
+        summary_path = os.path.join('results', name + '.summary.pdf')
+        _write_bytes(os.path.join(self.directory, summary_path), render_summary_pdf(summary, item['filename']))
+
+        quiz = generate_quiz(pdf_text, self.manifest['difficulty'], self.manifest['topics'])
+        quiz_path = os.path.join('results', name + '.quiz.json')
+        _write_json(os.path.join(self.directory, quiz_path), {'source': item['filename'], 'questions': quiz})
+
+        return {'page_count': page_count, 'summary_pdf': summary_path, 'quiz': quiz_path}
+
+    def run(self, workers=None, on_item=None):
+        """
+        Process every pending item on a bounded thread pool, then write the zip.
+
+        Args:
+            workers (int): Items processed at once, BATCH_WORKERS by default
+            on_item (callable): Called with (name, item) as each item finishes
+
+        Returns:
+            dict: Counts of items by status
+        """
+        app = current_app._get_current_object()
+        workers = workers or app.config.get('BATCH_WORKERS', 4)
+
+        def process(name):
+            with app.app_context():
+                return self._process(name)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as executor:
+            futures = {executor.submit(process, name): name for name in self.pending()}
+            for future in as_completed(futures):
+                name = futures[future]
+                item = self.items[name]
+                try:
+                    item.update(future.result(), status=DONE, error=None)
+                except Exception as e:
+                    app.logger.error(f"Batch {self.manifest['id']}: {name} failed: {e}")
+                    item.update(status=FAILED, error=str(e))
+                item['finished_at'] = time.time()
+                # Record every finished item, so an interrupted run can resume
+                self.save()
+                if on_item is not None:
+                    on_item(name, item)
+
+        self.write_zip()
+        return self.counts()
+
+    def counts(self):
+        counts = {PENDING: 0, DONE: 0, FAILED: 0}
+        for item in self.items.values():
+            counts[item['status']] += 1
+        return counts
+
+    @property
+    def zip_path(self):
+        return os.path.join(self.directory, ZIP_NAME)
+
+    def write_zip(self):
+        """Write results.zip with the summary PDFs, quiz JSON and manifest of the finished items."""
+        tmp_path = self.zip_path + '.tmp'
+        with zipfile.ZipFile(tmp_path, 'w') as archive:
+            for item in self.items.values():
+                if item['status'] != DONE:
+                    continue
+                # PDFs are compressed already
+                archive.write(os.path.join(self.directory, item['summary_pdf']), item['summary_pdf'],
+                              compress_type=zipfile.ZIP_STORED)
+                archive.write(os.path.join(self.directory, item['quiz']), item['quiz'],
+                              compress_type=zipfile.ZIP_DEFLATED)
+            archive.writestr(MANIFEST_NAME, json.dumps(self.manifest, indent=2), compress_type=zipfile.ZIP_DEFLATED)
+        os.replace(tmp_path, self.zip_path)
+        return self.zip_path
+
+
+@contextmanager
+def _file_lock(path):
+    """Hold an exclusive lock, shared by all processes, for a short critical section."""
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > STALE_LOCK_AGE:
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(path)
+
+
+def _write_bytes(path, data):
+    """Write a file atomically, so readers never see it half-written."""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def _write_json(path, value):
+    _write_bytes(path, json.dumps(value, indent=2).encode('utf-8'))
+
+
+def batch_directory(batch_id):
+    """Return the directory of a batch created through the web API."""
+    return os.path.join(current_app.config['BATCH_FOLDER'], secure_filename(batch_id))
+
+
+def create_batch(owner, files, difficulty='medium', topics=None):
+    """
+    Create a batch under BATCH_FOLDER from uploaded files.
+
+    Args:
+        owner (str): User ID allowed to see the batch
+        files (list): werkzeug FileStorage objects of the PDFs
+
+    Returns:
+        Batch: The new batch, not yet run
+    """
+    batch = Batch.create(batch_directory(uuid.uuid4().hex), owner=owner, difficulty=difficulty, topics=topics)
+    for file in files:
+        batch.add_pdf(file.filename, file.stream)
+    batch.save()
+    return batch
+
+
+def run_batch(batch_id):
+    """Background job: process a batch created through the web API."""
+    return Batch(batch_directory(batch_id)).run()
+
+
+def register_batch(app):
+    """Add the `flask batch` command."""
+
+    @app.cli.command('batch')
+    @click.argument('sources', nargs=-1, required=True, type=click.Path(exists=True))
+    @click.option('--output', '-o', required=True, type=click.Path(file_okay=False),
+                  help='Batch directory; running again with the same one resumes the batch')
+    @click.option('--difficulty', default='medium', type=click.Choice(['easy', 'medium', 'hard']))
+    @click.option('--topics', default='', help='Comma-separated topics for the quizzes')
+    @click.option('--workers', type=int, default=None, help='PDFs processed at once (default: BATCH_WORKERS)')
+    def batch_command(sources, output, difficulty, topics, workers):
+        """Summarize and quiz many PDFs (files or directories) into a results zip."""
+        topics = [topic.strip() for topic in topics.split(',') if topic.strip()]
+        batch = Batch.create(output, difficulty=difficulty, topics=topics)
+
+        # PDFs already in the batch (from an interrupted run) are not added again
+        known = {item.get('source') for item in batch.items.values()}
+        for source in sources:
+            paths = [source]
+            if os.path.isdir(source):
+                paths = sorted(os.path.join(source, name) for name in os.listdir(source))
+            for path in paths:
+                if path.lower().endswith('.pdf') and os.path.abspath(path) not in known:
+                    batch.add_pdf(path, path)
+                    known.add(os.path.abspath(path))
+        batch.save()
+
+        total = len(batch.items)
+        click.echo(f"{total - len(batch.pending())} of {total} PDFs already done")
+
+        def report(name, item):
+            message = item['error'] if item['status'] == FAILED else f"{item['page_count']} pages"
+            click.echo(f"{item['status']}: {name} ({message})")
+
+        counts = batch.run(workers=workers, on_item=report)
+        click.echo(f"{counts[DONE]} done, {counts[FAILED]} failed; results in {batch.zip_path}")
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+# Registry of named caches so their counters can be reported together
+_caches = {}
+_caches_lock = threading.Lock()
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """Content-addressed cache of files on disk with size and age eviction.
+
+    Entries live at ``<directory>/<key[:2]>/<key><suffix>``. The modification
+    time of an entry is its creation time (used for age eviction) and the
+    access time is bumped explicitly on every hit (used for LRU eviction).
+    Hit/miss counters are kept per process.
+    """
+
+    def __init__(self, name, directory, max_bytes=0, max_age=0, suffix='.bin', evict_interval=60):
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.suffix = suffix
+        self.evict_interval = evict_interval
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._last_evict = 0.0
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_path(self, key):
+        """Return the path of the cached file for key, or None on a miss.
+
+        Counts the lookup and records the access for LRU eviction; callers
+        that serve the file can pass the path on instead of reading it.
+        """
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if self.max_age and time.time() - stat.st_mtime > self.max_age:
+                self._remove(path)
+                self._count(False)
+                return None
+            # Record the access for LRU eviction without touching the creation time
+            os.utime(path, (time.time(), stat.st_mtime))
+        except FileNotFoundError:
+            self._count(False)
+            return None
+        self._count(True)
+        return path
+
+    def get_bytes(self, key):
+        """Return the cached bytes for key, or None on a miss."""
+        path = self.get_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            # Evicted between the lookup and the read
+            return None
+
+    def set_bytes(self, key, data):
+        """Store bytes under key, replacing any previous entry atomically. Returns the entry's path."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        self._maybe_evict()
+        return path
+
+    def get_json(self, key):
+        """Return the cached JSON value for key, or None on a miss."""
+        data = self.get_bytes(key)
+        if data is None:
+            return None
+        try:
+            return json.loads(data.decode('utf-8'))
+        except ValueError:
+            self._remove(self._path(key))
+            return None
+
+    def set_json(self, key, value):
+        """Store a JSON-serialisable value under key."""
+        self.set_bytes(key, json.dumps(value).encode('utf-8'))
+
+    def delete(self, key):
+        self._remove(self._path(key))
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _maybe_evict(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_evict < self.evict_interval:
+                return
+            self._last_evict = now
+        self.evict()
+
+    def _entries(self):
+        for root, _dirs, files in os.walk(self.directory):
+            for filename in files:
+                if not filename.endswith(self.suffix) or filename.startswith('.tmp-'):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    yield path, os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        now = time.time()
+        removed = 0
+        live = []
+        for path, stat in self._entries():
+            if self.max_age and now - stat.st_mtime > self.max_age:
+                removed += self._remove(path)
+            else:
+                live.append((stat.st_atime, stat.st_size, path))
+
+        if self.max_bytes:
+            total = sum(size for _atime, size, _path in live)
+            live.sort()
+            for _atime, size, path in live:
+                if total <= self.max_bytes:
+                    break
+                removed += self._remove(path)
+                total -= size
+
+        with self._lock:
+            self.evictions += removed
+        return removed
+
+    def stats(self):
+        """Return the hit/miss counters for this process."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'evictions': self.evictions,
+            }
+
+
+def get_cache(name, directory, max_bytes=0, max_age=0, suffix='.bin'):
+    """Return the process-wide cache registered under name, creating it on first use."""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None or cache.directory != directory:
+            cache = DiskCache(name, directory, max_bytes=max_bytes, max_age=max_age, suffix=suffix)
+            _caches[name] = cache
+        return cache
+
+
+def cache_stats():
+    """Return the counters of every registered cache, keyed by cache name."""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {cache.name: cache.stats() for cache in caches}
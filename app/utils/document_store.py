@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import uuid
+import threading
+from flask import current_app
+from app.utils.sqlite_db import connect
+
+# One store per database path, shared by all requests of this process
+_stores = {}
+_stores_lock = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    owner TEXT,
+    original_filename TEXT,
+    pdf_path TEXT,
+    content_hash TEXT,
+    page_count INTEGER,
+    summary TEXT,
+    quiz TEXT,
+    quiz_status TEXT,
+    question_bank TEXT,
+    created_at REAL,
+    accessed_at REAL
+);
+CREATE INDEX IF NOT EXISTS documents_content_hash ON documents (content_hash);
+CREATE TABLE IF NOT EXISTS blobs (
+    content_hash TEXT PRIMARY KEY,
+    path TEXT,
+    size INTEGER,
+    refcount INTEGER,
+    page_count INTEGER,
+    text TEXT,
+    created_at REAL,
+    accessed_at REAL
+);
+"""
+
+# Values of quiz_status
+QUIZ_GENERATING = 'generating'
+QUIZ_COMPLETE = 'complete'
+QUIZ_FAILED = 'failed'
+
+# Columns returned by get_document(); the large text, summary and quiz are loaded separately
+METADATA_COLUMNS = (
+    'id', 'owner', 'original_filename', 'pdf_path', 'content_hash',
+    'page_count', 'quiz_status', 'created_at', 'accessed_at'
+)
+
+
+class DocumentStore:
+    """SQLite store for uploaded documents and everything derived from them.
+
+    The Flask session only keeps the document ID; extracted text, the summary
+    and the quiz are read from here by the routes that need them.
+
+    Uploaded files are stored once per content hash in the blobs table, with
+    a reference count of the documents using them. The extracted text lives
+    with the blob, so identical uploads share both the file and its text.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def create_document(self, owner, original_filename, pdf_path, content_hash, page_count):
+        """Store a newly uploaded document and return its ID; its text is read from its blob."""
+        document_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT INTO documents (id, owner, original_filename, pdf_path, content_hash, '
+                'page_count, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (document_id, owner, original_filename, pdf_path, content_hash, page_count, now, now)
+            )
+        return document_id
+
+    def get_document(self, document_id):
+        """Return the document's metadata as a dict, or None if it does not exist."""
+        row = self._connection().execute(
+            f"SELECT {', '.join(METADATA_COLUMNS)} FROM documents WHERE id = ?", (document_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def _get_column(self, document_id, column):
+        row = self._connection().execute(
+            f'SELECT {column} FROM documents WHERE id = ?', (document_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def touch_document(self, document_id):
+        """Record that a session used the document, which keeps the janitor away from it."""
+        with self._connection() as conn:
+            conn.execute('UPDATE documents SET accessed_at = ? WHERE id = ?', (time.time(), document_id))
+
+    def iter_documents_accessed_before(self, cutoff):
+        """Return metadata of documents not used since cutoff, least recently used first."""
+        rows = self._connection().execute(
+            f"SELECT {', '.join(METADATA_COLUMNS)} FROM documents WHERE accessed_at < ? ORDER BY accessed_at",
+            (cutoff,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete_document(self, document_id):
+        """
+        Delete a document, dropping its reference to the uploaded file.
+
+        Returns:
+            int: Bytes of files deleted with it, or None if the document did not exist
+        """
+        with self._connection() as conn:
+            # Only the caller whose DELETE removed the row releases the blob
+            row = conn.execute('SELECT content_hash FROM documents WHERE id = ?', (document_id,)).fetchone()
+            if row is None or conn.execute('DELETE FROM documents WHERE id = ?', (document_id,)).rowcount == 0:
+                return None
+            return self._release_blob(conn, row['content_hash'])
+
+    def get_text(self, document_id):
+        """Return the extracted text of a document."""
+        row = self._connection().execute(
+            'SELECT b.text FROM documents d JOIN blobs b ON b.content_hash = d.content_hash WHERE d.id = ?',
+            (document_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_summary(self, document_id):
+        """Return the document's summary, or None if none was generated yet."""
+        return self._get_column(document_id, 'summary')
+
+    def set_summary(self, document_id, summary):
+        """Store the document's summary. Its PDF is rendered on demand and cached separately."""
+        with self._connection() as conn:
+            conn.execute(
+                'UPDATE documents SET summary = ?, accessed_at = ? WHERE id = ?',
+                (summary, time.time(), document_id)
+            )
+
+    def get_quiz(self, document_id):
+        """Return the document's quiz questions, or None if there is no quiz or it has no questions yet."""
+        row = self._connection().execute(
+            'SELECT quiz, quiz_status FROM documents WHERE id = ?', (document_id,)
+        ).fetchone()
+        if not row or not row[0]:
+            return None
+        quiz = json.loads(row[0])
+        # A quiz still being generated may be empty for now; a finished empty quiz is no quiz
+        if not quiz and row[1] != QUIZ_GENERATING:
+            return None
+        return quiz
+
+    def set_quiz(self, document_id, quiz):
+        """Store a complete quiz, replacing any earlier one."""
+        with self._connection() as conn:
+            conn.execute(
+                'UPDATE documents SET quiz = ?, quiz_status = ?, accessed_at = ? WHERE id = ?',
+                (json.dumps(quiz), QUIZ_COMPLETE, time.time(), document_id)
+            )
+
+    def start_quiz(self, document_id):
+        """Replace any earlier quiz with an empty one whose questions are still being generated."""
+        with self._connection() as conn:
+            conn.execute(
+                'UPDATE documents SET quiz = ?, quiz_status = ?, accessed_at = ? WHERE id = ?',
+                ('[]', QUIZ_GENERATING, time.time(), document_id)
+            )
+
+    def append_quiz_question(self, document_id, question):
+        """Add one question to a quiz that is still being generated."""
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE documents SET quiz = json_insert(quiz, '$[#]', json(?)) WHERE id = ?",
+                (json.dumps(question), document_id)
+            )
+
+    def finish_quiz(self, document_id):
+        """Mark a quiz as complete once its last question has been appended."""
+        with self._connection() as conn:
+            conn.execute('UPDATE documents SET quiz_status = ? WHERE id = ?', (QUIZ_COMPLETE, document_id))
+
+    def fail_quiz(self, document_id):
+        """Drop a quiz whose generation failed, so it is not mistaken for a finished one."""
+        with self._connection() as conn:
+            conn.execute('UPDATE documents SET quiz = NULL, quiz_status = ? WHERE id = ?', (QUIZ_FAILED, document_id))
+
+    def get_question_bank(self, document_id):
+        """Return the document's question bank, or None if none was generated yet."""
+        bank = self._get_column(document_id, 'question_bank')
+        return json.loads(bank) if bank else None
+
+    def add_to_question_bank(self, document_id, entries):
+        """Add entries to the document's question bank, skipping questions it already has."""
+        with self._connection() as conn:
+            # Writing first takes the database write lock, so concurrent additions are not lost
+            conn.execute(
+                "UPDATE documents SET question_bank = COALESCE(question_bank, '[]') WHERE id = ?", (document_id,)
+            )
+            row = conn.execute('SELECT question_bank FROM documents WHERE id = ?', (document_id,)).fetchone()
+            if row is None:
+                return
+            bank = json.loads(row[0])
+            seen = {entry['question'].lower() for entry in bank}
+            for entry in entries:
+                if entry['question'].lower() not in seen:
+                    seen.add(entry['question'].lower())
+                    bank.append(entry)
+            conn.execute('UPDATE documents SET question_bank = ? WHERE id = ?', (json.dumps(bank), document_id))
+
+    def acquire_blob(self, content_hash, path, size, source_path):
+        """
+        Add a reference to the blob with content_hash, storing the file if it is new.
+
+        Args:
+            content_hash (str): SHA-256 of the file contents
+            path (str): Content-addressed path of the file
+            size (int): File size in bytes
+            source_path (str): Freshly written copy of the file, moved to path if
+                no copy is stored yet; the caller removes it otherwise
+
+        Returns:
+            dict: The blob row, with page_count and text if they were extracted before
+        """
+        now = time.time()
+        with self._connection() as conn:
+            # Writing first takes the database write lock, so release_blob() cannot
+            # delete the file between the reference being added and the check below
+            conn.execute(
+                'INSERT INTO blobs (content_hash, path, size, refcount, created_at, accessed_at) '
+                'VALUES (?, ?, ?, 1, ?, ?) ON CONFLICT (content_hash) '
+                'DO UPDATE SET refcount = refcount + 1, accessed_at = excluded.accessed_at',
+                (content_hash, path, size, now, now)
+            )
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(source_path, path)
+            row = conn.execute('SELECT * FROM blobs WHERE content_hash = ?', (content_hash,)).fetchone()
+        return dict(row)
+
+    def set_blob_text(self, content_hash, text, page_count):
+        """Store the text extracted from a blob, for later uploads of the same file."""
+        with self._connection() as conn:
+            conn.execute(
+                'UPDATE blobs SET text = ?, page_count = ? WHERE content_hash = ?',
+                (text, page_count, content_hash)
+            )
+
+    def release_blob(self, content_hash):
+        """Drop one reference to a blob, deleting the blob and its file with the last one."""
+        with self._connection() as conn:
+            self._release_blob(conn, content_hash)
+
+    def _release_blob(self, conn, content_hash):
+        """Drop one reference inside an open transaction; returns the bytes deleted."""
+        conn.execute('UPDATE blobs SET refcount = refcount - 1 WHERE content_hash = ?', (content_hash,))
+        row = conn.execute(
+            'SELECT path FROM blobs WHERE content_hash = ? AND refcount <= 0', (content_hash,)
+        ).fetchone()
+        if row is None:
+            return 0
+        conn.execute('DELETE FROM blobs WHERE content_hash = ?', (content_hash,))
+        return _remove_file(row['path'])
+
+    def blob_paths(self):
+        """Return the paths of all stored upload files."""
+        return {row[0] for row in self._connection().execute('SELECT path FROM blobs')}
+
+
+def _remove_file(path):
+    """Delete a file if it exists and return its size."""
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except FileNotFoundError:
+        return 0
+
+def get_document_store():
+    """Return the document store configured for the current app."""
+    path = current_app.config['DOCUMENT_STORE_PATH']
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = DocumentStore(path)
+            _stores[path] = store
+        return store
@@ -1,13 +1,21 @@
 import os
 import json
-import requests
 import secrets
 import hashlib
 from flask import current_app, url_for, session
+from app.utils.http_client import get_http_session
 
 class FirebaseIntegration:
     """Class for Firebase integration."""
 
+    # Google and Firebase REST endpoints; override them to point at a test server
+    AUTH_URL = "https://accounts.google.com/o/oauth2/auth"
+    TOKENINFO_URL = "https://oauth2.googleapis.com/tokeninfo"
+    IDENTITY_TOOLKIT_URL = "https://identitytoolkit.googleapis.com/v1"
+    SECURE_TOKEN_URL = "https://securetoken.googleapis.com/v1"
+    STORAGE_URL = "https://firebasestorage.googleapis.com/v0"
+    FIRESTORE_URL = "https://firestore.googleapis.com/v1"
+
     def __init__(self):
         """Initialize Firebase configuration."""
         self.api_key = os.environ.get('FIREBASE_API_KEY')
@@ -51,24 +59,24 @@ class FirebaseIntegration:
 
     def sign_in_with_email_password(self, email, password):
         """Sign in with email and password."""
-        url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={self.api_key}"
+        url = f"{self.IDENTITY_TOOLKIT_URL}/accounts:signInWithPassword?key={self.api_key}"
         payload = {
             "email": email,
             "password": password,
             "returnSecureToken": True
         }
-        response = requests.post(url, json=payload)
+        response = get_http_session().post(url, json=payload)
         return response.json()
 
     def sign_up_with_email_password(self, email, password):
         """Sign up with email and password."""
-        url = f"https://identitytoolkit.googleapis.com/v1/accounts:signUp?key={self.api_key}"
+        url = f"{self.IDENTITY_TOOLKIT_URL}/accounts:signUp?key={self.api_key}"
         payload = {
             "email": email,
             "password": password,
             "returnSecureToken": True
         }
-        response = requests.post(url, json=payload)
+        response = get_http_session().post(url, json=payload)
         return response.json()
 
     def upload_file_to_storage(self, file_path, destination_path, id_token):
@@ -77,13 +85,13 @@ class FirebaseIntegration:
         # In a real application, you would use the Firebase Admin SDK
         # or the Firebase Storage REST API
         try:
-            url = f"https://firebasestorage.googleapis.com/v0/b/{self.storage_bucket}/o?name={destination_path}"
+            url = f"{self.STORAGE_URL}/b/{self.storage_bucket}/o?name={destination_path}"
             headers = {
                 "Authorization": f"Bearer {id_token}",
                 "Content-Type": "application/octet-stream"
             }
             with open(file_path, 'rb') as file:
-                response = requests.post(url, headers=headers, data=file)
+                response = get_http_session().post(url, headers=headers, data=file)
             return response.json()
         except Exception as e:
             print(f"Error uploading file to Firebase Storage: {e}")
@@ -95,7 +103,7 @@ class FirebaseIntegration:
         # In a real application, you would use the Firebase Admin SDK
         # or the Firestore REST API
         try:
-            url = f"https://firestore.googleapis.com/v1/projects/{self.project_id}/databases/(default)/documents/quiz_results/{user_id}"
+            url = f"{self.FIRESTORE_URL}/projects/{self.project_id}/databases/(default)/documents/quiz_results/{user_id}"
             headers = {
                 "Authorization": f"Bearer {id_token}",
                 "Content-Type": "application/json"
@@ -106,7 +114,7 @@ class FirebaseIntegration:
                     "quiz_data": {"mapValue": {"fields": self._convert_to_firestore_format(quiz_data)}}
                 }
             }
-            response = requests.post(url, headers=headers, json=payload)
+            response = get_http_session().post(url, headers=headers, json=payload)
             return response.json()
         except Exception as e:
             print(f"Error saving quiz results to Firestore: {e}")
@@ -119,7 +127,7 @@ class FirebaseIntegration:
 
         # Use the proper OAuth 2.0 client ID instead of Firebase API key
         return (
-            f"https://accounts.google.com/o/oauth2/auth"
+            f"{self.AUTH_URL}"
             f"?client_id={self.google_client_id}"
             f"&redirect_uri={redirect_uri}"
             f"&response_type=id_token token"
@@ -133,8 +141,8 @@ class FirebaseIntegration:
         """Verify the Google ID token."""
         try:
             # First, verify with Google's tokeninfo endpoint
-            google_verify_url = f"https://oauth2.googleapis.com/tokeninfo?id_token={id_token}"
-            google_response = requests.get(google_verify_url)
+            google_verify_url = f"{self.TOKENINFO_URL}?id_token={id_token}"
+            google_response = get_http_session().get(google_verify_url)
             google_data = google_response.json()
 
             # Check if the token is valid and issued for our client
@@ -145,14 +153,14 @@ class FirebaseIntegration:
                 return {"error": {"message": "Token was not issued for this application"}}
 
             # Now sign in with Firebase using the verified token
-            url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithIdp?key={self.api_key}"
+            url = f"{self.IDENTITY_TOOLKIT_URL}/accounts:signInWithIdp?key={self.api_key}"
             payload = {
                 "postBody": f"id_token={id_token}&providerId=google.com",
                 "requestUri": current_app.config.get('BASE_URL', 'http://localhost:5000'),
                 "returnIdpCredential": True,
                 "returnSecureToken": True
             }
-            response = requests.post(url, json=payload)
+            response = get_http_session().post(url, json=payload)
             firebase_data = response.json()
 
             # If Firebase authentication fails, still use Google data
@@ -175,11 +183,11 @@ class FirebaseIntegration:
 
     def get_user_profile(self, id_token):
         """Get user profile information."""
-        url = f"https://identitytoolkit.googleapis.com/v1/accounts:lookup?key={self.api_key}"
+        url = f"{self.IDENTITY_TOOLKIT_URL}/accounts:lookup?key={self.api_key}"
         payload = {
             "idToken": id_token
         }
-        response = requests.post(url, json=payload)
+        response = get_http_session().post(url, json=payload)
         return response.json()
 
     def store_user_session(self, user_data):
@@ -196,12 +204,12 @@ class FirebaseIntegration:
 
     def refresh_token(self, refresh_token):
         """Refresh the ID token."""
-        url = f"https://securetoken.googleapis.com/v1/token?key={self.api_key}"
+        url = f"{self.SECURE_TOKEN_URL}/token?key={self.api_key}"
         payload = {
             "grant_type": "refresh_token",
             "refresh_token": refresh_token
         }
-        response = requests.post(url, json=payload)
+        response = get_http_session().post(url, json=payload)
         return response.json()
 
     def _generate_state_token(self):
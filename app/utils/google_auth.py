@@ -1,14 +1,25 @@
 import os
 import json
-import requests
 import secrets
 import hashlib
+import threading
 import urllib.parse
 from flask import current_app, url_for, session, redirect
+from app.utils.http_client import get_http_session
+
+# Created on first use: the login page should not wait for it at startup
+_google_auth = None
+_google_auth_lock = threading.Lock()
+
 
 class GoogleAuth:
     """Class for Google OAuth authentication."""
 
+    # Google's OAuth endpoints; override them to point at a test server
+    AUTH_URL = "https://accounts.google.com/o/oauth2/auth"
+    TOKEN_URL = "https://oauth2.googleapis.com/token"
+    USERINFO_URL = "https://www.googleapis.com/oauth2/v3/userinfo"
+
     def __init__(self):
         """Initialize Google OAuth configuration."""
         self.google_client_id = os.environ.get('GOOGLE_CLIENT_ID')
@@ -43,7 +54,7 @@ class GoogleAuth:
         state = self._generate_state_token()
 
         return (
-            f"https://accounts.google.com/o/oauth2/auth"
+            f"{self.AUTH_URL}"
             f"?client_id={self.google_client_id}"
             f"&redirect_uri={encoded_redirect_uri}"
             f"&response_type=code"
@@ -62,7 +73,7 @@ class GoogleAuth:
         # Log the redirect URI for debugging
         current_app.logger.info(f"Token exchange redirect URI: {redirect_uri}")
 
-        token_url = "https://oauth2.googleapis.com/token"
+        token_url = self.TOKEN_URL
         payload = {
             "client_id": self.google_client_id,
             "client_secret": self.google_client_secret,
@@ -76,7 +87,7 @@ class GoogleAuth:
         debug_payload["client_secret"] = "REDACTED"
         current_app.logger.info(f"Token exchange payload: {debug_payload}")
 
-        response = requests.post(token_url, data=payload)
+        response = get_http_session().post(token_url, data=payload)
         if response.status_code != 200:
             error_data = response.json()
             current_app.logger.error(f"Token exchange error: {error_data}")
@@ -86,10 +97,10 @@ class GoogleAuth:
 
     def get_user_info(self, access_token):
         """Get user information using the access token."""
-        user_info_url = "https://www.googleapis.com/oauth2/v3/userinfo"
+        user_info_url = self.USERINFO_URL
         headers = {"Authorization": f"Bearer {access_token}"}
 
-        response = requests.get(user_info_url, headers=headers)
+        response = get_http_session().get(user_info_url, headers=headers)
         if response.status_code != 200:
             return {"error": response.json()}
 
@@ -117,7 +128,7 @@ class GoogleAuth:
 
     def refresh_token(self, refresh_token):
         """Refresh the access token."""
-        token_url = "https://oauth2.googleapis.com/token"
+        token_url = self.TOKEN_URL
         payload = {
             "client_id": self.google_client_id,
             "client_secret": self.google_client_secret,
@@ -125,7 +136,7 @@ class GoogleAuth:
             "grant_type": "refresh_token"
         }
 
-        response = requests.post(token_url, data=payload)
+        response = get_http_session().post(token_url, data=payload)
         return response.json()
 
     def _generate_state_token(self):
@@ -147,3 +158,14 @@ class GoogleAuth:
         current_app.logger.info(f"Session after state token generation: {list(session.keys())}")
 
         return token
+
+
+def get_google_auth():
+    """Return the process-wide GoogleAuth, creating it from the app config on first use."""
+    global _google_auth
+    if _google_auth is not None:
+        return _google_auth
+    with _google_auth_lock:
+        if _google_auth is None:
+            _google_auth = GoogleAuth()
+    return _google_auth
@@ -0,0 +1,66 @@
+import threading
+from flask import current_app
+
+# Statuses worth retrying: rate limiting and temporary server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def create_http_session(pool_size=20, retries=3, backoff=0.5, timeout=(5, 15)):
+    """
+    Create a requests session with pooled keep-alive connections, retries and timeouts.
+
+    Connection failures are retried with exponential backoff for every
+    method. Read errors and RETRY_STATUSES are only retried for idempotent
+    methods: a POST such as an authorization code exchange is not sent twice.
+
+    Args:
+        pool_size (int): Connections kept open per host
+        retries (int): Retries of a failed request
+        backoff (float): Backoff factor in seconds (backoff, 2 * backoff, ...)
+        timeout (tuple): (connect, read) timeout in seconds, used when a call passes none
+
+    Returns:
+        requests.Session: The session
+    """
+    # requests is only imported once an outgoing call is made, not at startup
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    class TimeoutSession(requests.Session):
+        def request(self, method, url, **kwargs):
+            kwargs.setdefault('timeout', timeout)
+            return super().request(method, url, **kwargs)
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = TimeoutSession()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_http_session():
+    """Return the process-wide HTTP session, creating it from the app config on first use."""
+    global _session
+    if _session is not None:
+        return _session
+    with _session_lock:
+        if _session is None:
+            config = current_app.config
+            _session = create_http_session(
+                pool_size=config.get('HTTP_POOL_SIZE', 20),
+                retries=config.get('HTTP_RETRIES', 3),
+                backoff=config.get('HTTP_RETRY_BACKOFF', 0.5),
+                timeout=(config.get('HTTP_CONNECT_TIMEOUT', 5), config.get('HTTP_READ_TIMEOUT', 15))
+            )
+    return _session
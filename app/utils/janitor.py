@@ -0,0 +1,216 @@
+import os
+import re
+import time
+import shutil
+import threading
+import click
+from flask import current_app
+from app.utils.document_store import get_document_store
+from app.utils.jobs import get_job_queue
+from app.utils.llm_cache import get_llm_cache
+from app.utils.pdf_processor import get_extraction_cache, get_summary_pdf_cache
+from app.utils.search_index import get_search_index_cache
+
+# Files younger than this are never treated as orphans; they may belong to an upload in progress
+ORPHAN_GRACE_PERIOD = 60 * 60
+
+# Session files of cachelib's file system cache are named by a hex digest of the
+# session key; anything else in SESSION_FILE_DIR (its count file, or SQLite session
+# shards from another SESSION_BACKEND) is left alone
+SESSION_FILE_NAME = re.compile(r'^[0-9a-f]{32,128}$')
+
+# The background janitor of this process, started on the first request
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def _folder_size(folder):
+    total = 0
+    for root, _dirs, files in os.walk(folder):
+        for filename in files:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except FileNotFoundError:
+                continue
+    return total
+
+
+def _remove_orphans(upload_folder, referenced, now):
+    """Delete upload files no document or blob refers to; returns (files, bytes) removed."""
+    removed = freed = 0
+    for root, _dirs, files in os.walk(upload_folder):
+        for filename in files:
+            if not (filename.endswith('.pdf') or filename.startswith('.upload-')):
+                continue
+            path = os.path.join(root, filename)
+            if path in referenced:
+                continue
+            try:
+                stat = os.stat(path)
+                if now - stat.st_mtime < ORPHAN_GRACE_PERIOD:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += stat.st_size
+    return removed, freed
+
+
+def _remove_old_batches(batch_folder, max_age, now):
+    """Delete batch directories not modified for max_age seconds; returns (batches, bytes) removed."""
+    removed = freed = 0
+    if not os.path.isdir(batch_folder):
+        return removed, freed
+    for name in os.listdir(batch_folder):
+        path = os.path.join(batch_folder, name)
+        try:
+            # The manifest is rewritten whenever an item of the batch finishes
+            modified = os.path.getmtime(os.path.join(path, 'manifest.json'))
+        except OSError:
+            modified = os.path.getmtime(path)
+        if now - modified < max_age:
+            continue
+        size = _folder_size(path)
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+        freed += size
+    return removed, freed
+
+
+def _prune_sessions(app, now):
+    """Delete expired sessions and return how many were deleted."""
+    interface = app.session_interface
+    if hasattr(interface, 'purge_expired'):
+        return interface.purge_expired()
+
+    # Flask-Session's filesystem backend only removes expired files once it is over
+    # its file-count threshold. Sessions are rewritten when used, so a file not
+    # modified for the session lifetime has expired.
+    if app.config.get('SESSION_BACKEND') != 'filesystem':
+        return None
+    session_dir = app.config['SESSION_FILE_DIR']
+    cutoff = now - app.permanent_session_lifetime.total_seconds()
+    removed = 0
+    try:
+        names = os.listdir(session_dir)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        if not SESSION_FILE_NAME.match(name):
+            continue
+        path = os.path.join(session_dir, name)
+        try:
+            if not os.path.isfile(path) or os.path.getmtime(path) >= cutoff:
+                continue
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        removed += 1
+    return removed
+
+
+def collect_garbage():
+    """
+    Delete uploads, derived files and sessions nobody can use any more.
+
+    Documents are deleted once they have not been used for UPLOAD_MAX_AGE, and
+    least recently used first while UPLOAD_FOLDER is over UPLOAD_MAX_BYTES. A
+    document used within the session lifetime may still be open in a live
+    session and is always kept. Also removes orphaned upload files, expired
+    session files, old batches and finished jobs, and evicts the on-disk caches.
+
+    Returns:
+        dict: What was removed, for logging
+    """
+    config = current_app.config
+    store = get_document_store()
+    upload_folder = config['UPLOAD_FOLDER']
+    now = time.time()
+    live_cutoff = now - current_app.permanent_session_lifetime.total_seconds()
+    stats = {'documents': 0, 'orphans': 0, 'bytes_freed': 0}
+
+    def delete(document):
+        freed = store.delete_document(document['id'])
+        if freed is not None:
+            stats['documents'] += 1
+            stats['bytes_freed'] += freed
+
+    # Age: documents nobody has used for UPLOAD_MAX_AGE
+    max_age = config.get('UPLOAD_MAX_AGE', 0)
+    if max_age:
+        for document in store.iter_documents_accessed_before(min(now - max_age, live_cutoff)):
+            delete(document)
+
+    # Files left behind by failed uploads or older versions of the app
+    stats['orphans'], freed = _remove_orphans(upload_folder, store.blob_paths(), now)
+    stats['bytes_freed'] += freed
+
+    # Quota: least recently used documents that no live session can refer to
+    max_bytes = config.get('UPLOAD_MAX_BYTES', 0)
+    if max_bytes:
+        used = _folder_size(upload_folder)
+        for document in store.iter_documents_accessed_before(live_cutoff):
+            if used <= max_bytes:
+                break
+            before = stats['bytes_freed']
+            delete(document)
+            used -= stats['bytes_freed'] - before
+        if used > max_bytes:
+            current_app.logger.warning(
+                f"Upload folder uses {used} bytes, over its {max_bytes} byte quota; the rest is in use by live sessions"
+            )
+        stats['upload_bytes'] = used
+
+    # Inputs and results of web batches
+    batch_max_age = config.get('BATCH_MAX_AGE', 0)
+    if batch_max_age and config.get('BATCH_FOLDER'):
+        stats['batches'], freed = _remove_old_batches(config['BATCH_FOLDER'], batch_max_age, now)
+        stats['bytes_freed'] += freed
+
+    stats['sessions'] = _prune_sessions(current_app._get_current_object(), now)
+    job_max_age = config.get('JOB_MAX_AGE', 0)
+    if job_max_age:
+        stats['jobs'] = get_job_queue().prune(job_max_age)
+    stats['cache_evictions'] = sum(
+        cache.evict() for cache in (get_extraction_cache(), get_summary_pdf_cache(), get_search_index_cache(),
+                                   get_llm_cache())
+    )
+    return stats
+
+
+def _run_periodically(app, interval):
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                stats = collect_garbage()
+                app.logger.info(f"Janitor run: {stats}")
+            except Exception as e:
+                app.logger.error(f"Janitor run failed: {e}", exc_info=True)
+
+
+def start_janitor():
+    """Start the background janitor of this process, once, if JANITOR_INTERVAL is set."""
+    global _thread
+    interval = current_app.config.get('JANITOR_INTERVAL', 0)
+    if not interval or _thread is not None:
+        return
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(
+                target=_run_periodically, args=(current_app._get_current_object(), interval),
+                name='janitor', daemon=True
+            )
+            _thread.start()
+
+
+def register_janitor(app):
+    """Add the `flask janitor` command and start the background janitor with the first request."""
+    app.before_request(start_janitor)
+
+    @app.cli.command('janitor')
+    def janitor_command():
+        """Delete expired uploads, derived files and sessions now."""
+        stats = collect_garbage()
+        click.echo(', '.join(f"{name}: {value}" for name, value in stats.items()))
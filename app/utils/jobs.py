@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app.utils.sqlite_db import connect
+
+# One queue per database path, shared by all requests of this process
+_queues = {}
+_queues_lock = threading.Lock()
+
+# The job running on the current thread, for report_progress()
+_current_job = threading.local()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT,
+    owner TEXT,
+    status TEXT,
+    result TEXT,
+    error TEXT,
+    progress TEXT,
+    timeout REAL,
+    created_at REAL,
+    started_at REAL,
+    finished_at REAL
+);
+"""
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobQueue:
+    """Runs slow work (LLM calls) on a local thread pool and records its state.
+
+    Job state lives in SQLite so that any worker process can answer a status
+    poll, even if the job runs in another one. With max_workers=0 jobs run
+    inline in the submitting request, which suits serverless hosts that
+    freeze the process once the response is sent.
+    """
+
+    def __init__(self, path, max_workers=4, timeout=600):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job') if max_workers else None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def _update(self, job_id, **fields):
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self._connection() as conn:
+            conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+
+    def submit(self, kind, owner, func, *args, timeout=None, job_id=None):
+        """
+        Queue func(*args) to run inside an app context and return the job ID.
+
+        Args:
+            kind (str): What the job produces, e.g. 'summary' or 'quiz'
+            owner (str): User ID allowed to see the job
+            func (callable): Work to run; its return value must be JSON-serialisable
+            timeout (float): Seconds the job may run, the queue's timeout by default
+            job_id (str): ID for the job, if the caller had to record it before submitting
+        """
+        job_id = job_id or uuid.uuid4().hex
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, owner, status, timeout, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, kind, owner, QUEUED, timeout, time.time())
+            )
+
+        app = current_app._get_current_object()
+        if self._executor is None:
+            self._run(app, job_id, func, args)
+        else:
+            self._executor.submit(self._run, app, job_id, func, args)
+        return job_id
+
+    def _run(self, app, job_id, func, args):
+        with app.app_context():
+            self._update(job_id, status=RUNNING, started_at=time.time())
+            _current_job.queue, _current_job.job_id = self, job_id
+            try:
+                result = func(*args)
+            except Exception as e:
+                app.logger.error(f"Job {job_id} failed: {e}", exc_info=True)
+                self._update(job_id, status=FAILED, error=str(e), progress=None, finished_at=time.time())
+                return
+            finally:
+                _current_job.queue = _current_job.job_id = None
+            # The result supersedes the progress, which may hold a copy of it
+            self._update(job_id, status=DONE, result=json.dumps(result), progress=None, finished_at=time.time())
+
+    def set_progress(self, job_id, progress):
+        """Record JSON-serialisable progress of a running job, reported by get()."""
+        self._update(job_id, progress=json.dumps(progress))
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist."""
+        row = self._connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['progress'] = json.loads(job['progress']) if job['progress'] else None
+
+        # A job whose worker died never finishes; report it as failed after the timeout,
+        # counted from when it started, or for a job that never started from its creation
+        if job['status'] in (QUEUED, RUNNING):
+            since = job['started_at'] if job['status'] == RUNNING else job['created_at']
+            if time.time() - since > (job['timeout'] or self.timeout):
+                job['status'] = FAILED
+                job['error'] = 'Job timed out'
+        return job
+
+    def prune(self, older_than):
+        """
+        Delete jobs that finished, or timed out, more than older_than seconds ago.
+
+        Returns:
+            int: Number of jobs deleted
+        """
+        cutoff = time.time() - older_than
+        with self._connection() as conn:
+            return conn.execute(
+                'DELETE FROM jobs WHERE (status IN (?, ?) AND finished_at < ?) '
+                'OR (status IN (?, ?) AND COALESCE(started_at, created_at) + COALESCE(timeout, ?) < ?)',
+                (DONE, FAILED, cutoff, QUEUED, RUNNING, self.timeout, cutoff)
+            ).rowcount
+
+
+def report_progress(progress):
+    """Record progress of the job running on this thread; does nothing outside a job."""
+    queue = getattr(_current_job, 'queue', None)
+    if queue is not None:
+        queue.set_progress(_current_job.job_id, progress)
+
+
+def get_job_queue():
+    """Return the job queue configured for the current app."""
+    config = current_app.config
+    path = config['DOCUMENT_STORE_PATH']
+    with _queues_lock:
+        queue = _queues.get(path)
+        if queue is None:
+            queue = JobQueue(path, max_workers=config.get('JOB_WORKERS', 4), timeout=config.get('JOB_TIMEOUT', 600))
+            _queues[path] = queue
+        return queue
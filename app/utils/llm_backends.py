@@ -0,0 +1,136 @@
+import re
+import json
+import time
+import random
+import hashlib
+
+# Pad the stub's answer options when the text has fewer than four distinct words
+FILLER_WORDS = ('document', 'content', 'topic', 'summary', 'section', 'chapter')
+
+
+class LLMBackend:
+    """Interface of a text generation backend used by LLMClient.
+
+    Backends only produce text; rate limiting, concurrency limits and
+    timeouts are applied by the client around them.
+    """
+
+    # Identifies the backend's responses in cache keys
+    name = None
+
+    def generate(self, prompt):
+        """Return the complete response text for a prompt."""
+        raise NotImplementedError
+
+    def generate_stream(self, prompt):
+        """Yield the response text in pieces as it is produced."""
+        yield self.generate(prompt)
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through the google-generativeai SDK."""
+
+    def __init__(self, api_key, model_name):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt):
+        return self.model.generate_content(prompt).text
+
+    def generate_stream(self, prompt):
+        for chunk in self.model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+
+class StubBackendError(Exception):
+    """Failure injected by StubBackend."""
+
+
+class StubBackend(LLMBackend):
+    """Local stand-in for Gemini for load tests and benchmarks.
+
+    Answers summary prompts with a markdown summary and quiz prompts with a
+    JSON array of questions, both built from words of the prompt's text.
+    Latency, jitter and injected errors are drawn from a random generator
+    seeded with the prompt, so the same prompt always behaves the same way.
+    """
+
+    name = 'stub'
+
+    def __init__(self, latency=0.5, jitter=0.2, error_rate=0.0, seed=0, stream_pieces=20):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.seed = seed
+        self.stream_pieces = max(1, stream_pieces)
+
+    def _random(self, prompt):
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode('utf-8')).digest()
+        return random.Random(int.from_bytes(digest[:8], 'big'))
+
+    def _delay(self, rng):
+        return max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+
+    def _respond(self, prompt, rng):
+        if rng.random() < self.error_rate:
+            raise StubBackendError("Injected stub backend error")
+
+        text = prompt.split('TEXT:', 1)[-1]
+        words = re.findall(r'[A-Za-z]{5,}', text) or ['document', 'content', 'topic', 'summary']
+
+        question_count = re.search(r'generate (\d+) multiple-choice', prompt)
+        if question_count:
+            questions = self._questions(int(question_count.group(1)), words, rng)
+            if '"difficulty":' in prompt:
+                # Question bank prompts ask for tagged questions
+                for i, question in enumerate(questions):
+                    question['difficulty'] = ('easy', 'medium', 'hard')[i % 3]
+                    question['topic'] = rng.choice(words)
+            return json.dumps(questions, indent=2)
+        return self._summary(words, rng)
+
+    def _questions(self, count, words, rng):
+        # Options must be distinct (case-insensitively) to pass the quiz validator
+        terms = list({word.lower(): word for word in words}.values())
+        terms += [word for word in FILLER_WORDS if word not in {term.lower() for term in terms}]
+        questions = []
+        for i in range(count):
+            choices = rng.sample(terms, 4)
+            options = [f"{letter}. {choice}" for letter, choice in zip('ABCD', choices)]
+            questions.append({
+                "question": f"Question {i + 1}: which term is discussed in relation to {rng.choice(words)}?",
+                "options": options,
+                "correct_answer": options[rng.randrange(4)],
+                "explanation": f"The text links this term to {rng.choice(words)}."
+            })
+        return questions
+
+    def _summary(self, words, rng):
+        lines = []
+        for section in range(1, 4):
+            lines.append(f"## Topic {section}: {rng.choice(words).capitalize()}")
+            for _ in range(4):
+                lines.append(f"- {' '.join(rng.choice(words) for _ in range(8)).capitalize()}.")
+            lines.append("")
+        return "# Summary\n\n" + "\n".join(lines)
+
+    def generate(self, prompt):
+        rng = self._random(prompt)
+        time.sleep(self._delay(rng))
+        return self._respond(prompt, rng)
+
+    def generate_stream(self, prompt):
+        rng = self._random(prompt)
+        delay = self._delay(rng)
+
+        # Spend a fifth of the latency before the first piece and spread the rest
+        time.sleep(delay / 5)
+        response = self._respond(prompt, rng)
+        size = -(-len(response) // self.stream_pieces)
+        for start in range(0, len(response), size):
+            yield response[start:start + size]
+            time.sleep(delay * 4 / 5 / self.stream_pieces)
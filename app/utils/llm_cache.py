@@ -0,0 +1,61 @@
+import json
+import hashlib
+from flask import current_app
+from app.utils.disk_cache import get_cache
+
+
+def llm_cache_key(kind, text, model_name, prompt_version, params=None):
+    """
+    Build the cache key of a model response.
+
+    Args:
+        kind (str): What is generated, e.g. 'summary' or 'quiz'
+        text (str): The document text the prompt is built from
+        model_name (str): The model answering the prompt
+        prompt_version (int): Version of the prompt template; bump it when the prompt changes
+        params (dict): Any other settings that change the response (difficulty, topics, ...)
+
+    Returns:
+        str: SHA-256 hex digest identifying the response
+    """
+    key = {
+        'kind': kind,
+        'text': hashlib.sha256(text.encode('utf-8')).hexdigest(),
+        'model': model_name,
+        'prompt_version': prompt_version,
+        'params': params or {},
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def get_llm_cache():
+    """Return the on-disk cache of model responses (LRU by size, TTL by age)."""
+    config = current_app.config
+    return get_cache(
+        'llm',
+        config['LLM_CACHE_DIR'],
+        max_bytes=config.get('LLM_CACHE_MAX_BYTES', 0),
+        max_age=config.get('LLM_CACHE_TTL', 0),
+        suffix='.json'
+    )
+
+
+def get_cached_response(cache_key):
+    """Return the cached response for cache_key, or None on a miss or when caching is off."""
+    if not current_app.config.get('LLM_CACHE_ENABLED', True):
+        return None
+    cached = get_llm_cache().get_json(cache_key)
+    if cached is None:
+        return None
+    current_app.logger.info(f"LLM cache hit for {cache_key[:12]}")
+    return cached['response']
+
+
+def store_response(cache_key, response):
+    """Cache a successful model response; failures to write are only logged."""
+    if not current_app.config.get('LLM_CACHE_ENABLED', True):
+        return
+    try:
+        get_llm_cache().set_json(cache_key, {'response': response})
+    except OSError as e:
+        current_app.logger.warning(f"Could not write LLM cache entry: {e}")
@@ -0,0 +1,235 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import current_app
+from app.utils.llm_backends import GeminiBackend, StubBackend
+from app.utils.metrics import (timed, count_error, observe_stage, LLM_PROMPT_CHARS, LLM_RESPONSE_CHARS,
+                               LLM_FIRST_PIECE_SECONDS)
+
+# Marks the end of a streamed response
+_END_OF_STREAM = object()
+
+# Process-wide client, created on first use
+_client = None
+_client_lock = threading.Lock()
+
+
+class LLMError(Exception):
+    """Base class for errors raised by the LLM client itself."""
+
+
+class LLMTimeoutError(LLMError):
+    """Raised when a call did not finish (or could not start) in time."""
+
+
+class TokenBucket:
+    """Token-bucket rate limiter; acquire() waits for a token instead of failing."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Take one token, waiting up to timeout seconds. Returns False on timeout."""
+        if self.rate <= 0:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class LLMClient:
+    """Shared client for the configured LLM backend (Gemini by default).
+
+    Creates the backend once and bounds the load this process puts on it:
+    a token bucket spreads bursts out to the allowed request rate, a
+    semaphore caps calls in flight, and every call has a timeout. Callers
+    that cannot get a slot in time get LLMTimeoutError.
+    """
+
+    def __init__(self, backend, max_concurrency=8, requests_per_minute=0, burst=10,
+                 timeout=120, queue_timeout=120):
+        self.backend = backend
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        # A call that times out keeps its thread (and its slot) until the backend returns
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='llm')
+
+    @property
+    def model_name(self):
+        return self.backend.name
+
+    def _submit(self, func, *args):
+        """Run func on the executor once a slot is free; func must release the slot."""
+        self._acquire_slot()
+        try:
+            return self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _acquire_slot(self):
+        start = time.monotonic()
+        if not self._bucket.acquire(self.queue_timeout):
+            raise LLMTimeoutError("Timed out waiting for the LLM rate limit")
+        remaining = max(0, self.queue_timeout - (time.monotonic() - start))
+        if not self._slots.acquire(timeout=remaining):
+            raise LLMTimeoutError("Timed out waiting for a free LLM slot")
+
+    def _call(self, prompt):
+        try:
+            return self.backend.generate(prompt)
+        finally:
+            self._slots.release()
+
+    def _call_stream(self, prompt, pieces):
+        try:
+            for piece in self.backend.generate_stream(prompt):
+                pieces.put(piece)
+            pieces.put(_END_OF_STREAM)
+        except Exception as e:
+            pieces.put(e)
+        finally:
+            self._slots.release()
+
+    def generate(self, prompt, timeout=None):
+        """
+        Send a prompt and return the response text.
+
+        Args:
+            prompt (str): The prompt
+            timeout (float): Seconds to wait for the response; the configured default if None
+
+        Raises:
+            LLMTimeoutError: If no slot was free in time or the call took too long
+        """
+        LLM_PROMPT_CHARS.observe(len(prompt), backend=self.model_name)
+        with timed('llm_call'):
+            with timed('llm_queue'):
+                future = self._submit(self._call, prompt)
+            try:
+                response = future.result(timeout=timeout or self.timeout)
+            except FutureTimeoutError:
+                raise LLMTimeoutError(f"LLM call timed out after {timeout or self.timeout}s")
+        LLM_RESPONSE_CHARS.observe(len(response or ''), backend=self.model_name)
+        return response
+
+    def generate_stream(self, prompt, timeout=None):
+        """
+        Send a prompt and yield the response text piece by piece as it arrives.
+
+        Args:
+            prompt (str): The prompt
+            timeout (float): Seconds to wait for each piece; the configured default if None
+
+        Raises:
+            LLMTimeoutError: If no slot was free in time or the model stalled
+        """
+        timeout = timeout or self.timeout
+        pieces = queue.Queue()
+        LLM_PROMPT_CHARS.observe(len(prompt), backend=self.model_name)
+        start = time.perf_counter()
+        with timed('llm_queue'):
+            self._submit(self._call_stream, prompt, pieces)
+
+        # Only time spent waiting for the model counts, not the caller's work between pieces
+        waited = 0.0
+        response_chars = 0
+        try:
+            while True:
+                wait_start = time.perf_counter()
+                try:
+                    piece = pieces.get(timeout=timeout)
+                except queue.Empty:
+                    raise LLMTimeoutError(f"No response from the LLM for {timeout}s")
+                finally:
+                    waited += time.perf_counter() - wait_start
+                if piece is _END_OF_STREAM:
+                    LLM_RESPONSE_CHARS.observe(response_chars, backend=self.model_name)
+                    return
+                if isinstance(piece, Exception):
+                    raise piece
+                if not response_chars:
+                    LLM_FIRST_PIECE_SECONDS.observe(time.perf_counter() - start, backend=self.model_name)
+                response_chars += len(piece)
+                yield piece
+        except Exception:
+            count_error('llm_call')
+            raise
+        finally:
+            observe_stage('llm_call', waited)
+
+
+def _get_api_key():
+    # Get API key from environment variable
+    api_key = os.environ.get('GEMINI_API_KEY')
+    if not api_key:
+        api_key = current_app.config.get('GEMINI_API_KEY')
+
+    # Remove quotes if present
+    if api_key and api_key.startswith("'") and api_key.endswith("'"):
+        api_key = api_key[1:-1]
+    return api_key
+
+
+def model_identifier():
+    """Return the name of the configured model, as used in response cache keys."""
+    config = current_app.config
+    if config.get('LLM_BACKEND', 'gemini') == 'stub':
+        return StubBackend.name
+    return config.get('GEMINI_MODEL', 'gemini-2.0-flash')
+
+
+def create_backend(config):
+    """Build the LLM backend selected by LLM_BACKEND ('gemini' or 'stub')."""
+    backend = config.get('LLM_BACKEND', 'gemini')
+    if backend == 'stub':
+        return StubBackend(
+            latency=config.get('LLM_STUB_LATENCY', 0.5),
+            jitter=config.get('LLM_STUB_JITTER', 0.2),
+            error_rate=config.get('LLM_STUB_ERROR_RATE', 0.0),
+            seed=config.get('LLM_STUB_SEED', 0)
+        )
+    if backend == 'gemini':
+        return GeminiBackend(_get_api_key(), config.get('GEMINI_MODEL', 'gemini-2.0-flash'))
+    raise ValueError(f"Unknown LLM_BACKEND: {backend}")
+
+
+def get_llm_client():
+    """Return the process-wide LLM client, creating it from the app config on first use."""
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None:
+            config = current_app.config
+            _client = LLMClient(
+                create_backend(config),
+                max_concurrency=config.get('GEMINI_MAX_CONCURRENCY', 8),
+                requests_per_minute=config.get('GEMINI_REQUESTS_PER_MINUTE', 0),
+                burst=config.get('GEMINI_BURST', 10),
+                timeout=config.get('GEMINI_TIMEOUT', 120),
+                queue_timeout=config.get('GEMINI_QUEUE_TIMEOUT', 120)
+            )
+        return _client
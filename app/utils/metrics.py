@@ -0,0 +1,219 @@
+import hmac
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from flask import g, request, Response, abort
+
+# Upper bounds (seconds) of the latency histogram buckets, from cache hits to long model calls
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Upper bounds (characters) of the size histogram buckets
+SIZE_BUCKETS = (100, 1000, 5000, 10000, 25000, 50000, 100000, 250000, 1000000)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic count per label combination, e.g. errors per stage."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Distribution of observed values per label combination, in cumulative buckets.
+
+    Observing is a bisect and three additions under a lock, cheap enough
+    for every request.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts, the last one for values above every bound; then sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(self.labels, key, [('le', _format_value(bound))])} {cumulative}"
+            cumulative += counts[-1]
+            yield f"{self.name}_bucket{_format_labels(self.labels, key, [('le', '+Inf')])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}"
+
+
+def counter(name, documentation, labels=()):
+    """Create and register a counter."""
+    metric = Counter(name, documentation, labels)
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+def histogram(name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+    """Create and register a histogram."""
+    metric = Histogram(name, documentation, labels, buckets)
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+def render_metrics():
+    """Return every registered metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+STAGE_SECONDS = histogram(
+    'pdf_quiz_stage_seconds', 'Time spent in each stage of the document pipeline.', labels=('stage',)
+)
+STAGE_ERRORS = counter(
+    'pdf_quiz_stage_errors_total', 'Stage runs that raised an exception.', labels=('stage',)
+)
+LLM_PROMPT_CHARS = histogram(
+    'pdf_quiz_llm_prompt_chars', 'Characters sent to the model per call.', labels=('backend',), buckets=SIZE_BUCKETS
+)
+LLM_RESPONSE_CHARS = histogram(
+    'pdf_quiz_llm_response_chars', 'Characters received from the model per call.', labels=('backend',),
+    buckets=SIZE_BUCKETS
+)
+LLM_FIRST_PIECE_SECONDS = histogram(
+    'pdf_quiz_llm_first_piece_seconds', 'Time until the first piece of a streamed model response.',
+    labels=('backend',)
+)
+HTTP_REQUEST_SECONDS = histogram(
+    'pdf_quiz_http_request_seconds', 'Time to handle a request, by endpoint and status code.',
+    labels=('endpoint', 'status')
+)
+
+
+@contextmanager
+def timed(stage):
+    """Record the duration of the block under stage, and count it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def observe_stage(stage, seconds):
+    """Record a stage duration measured by the caller, e.g. summed over a stream."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+def count_error(stage):
+    STAGE_ERRORS.inc(stage=stage)
+
+
+def _instrument_session_interface(interface):
+    """Time session loads and saves, whichever backend the interface uses."""
+    open_session, save_session = interface.open_session, interface.save_session
+
+    def timed_open_session(app, request):
+        with timed('session_load'):
+            return open_session(app, request)
+
+    def timed_save_session(app, session, response):
+        with timed('session_save'):
+            return save_session(app, session, response)
+
+    interface.open_session = timed_open_session
+    interface.save_session = timed_save_session
+
+
+def register_metrics(app):
+    """
+    Time every request and session access, and serve the metrics on /metrics.
+
+    Metrics are kept per process. Scrapers must send METRICS_TOKEN as a bearer
+    token; without a token configured the endpoint is not served at all.
+    """
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    _instrument_session_interface(app.session_interface)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint or 'unknown',
+                                         status=response.status_code)
+        return response
+
+    def metrics():
+        token = app.config.get('METRICS_TOKEN')
+        if not token:
+            abort(404)
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
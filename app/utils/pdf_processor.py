@@ -1,109 +1,514 @@
+import io
 import os
-import PyPDF2
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.units import inch
-from flask import current_app
-import uuid
+import json
+import hashlib
+import threading
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app, has_app_context
+from contextlib import contextmanager
+from app.utils.disk_cache import get_cache, hash_file
+from app.utils.llm_cache import llm_cache_key, get_cached_response, store_response
+from app.utils.llm_client import get_llm_client, model_identifier
+from app.utils.metrics import timed
+
+# Pages are joined with a form feed so later steps can split on page boundaries
+PAGE_SEPARATOR = "\f"
+
+# Bumped whenever the layout of extracted text changes, invalidating cached entries
+EXTRACTION_FORMAT_VERSION = 2
+
+# Default number of document characters sent to the model in one prompt
+DEFAULT_PROMPT_CHAR_BUDGET = 100000
+
+# Bump when any summary prompt below changes, so cached summaries are not reused
+SUMMARY_PROMPT_VERSION = 1
+
+# Bump when the summary PDF layout changes, so cached renders are not reused
+SUMMARY_PDF_FORMAT_VERSION = 2
+
+# One lock per summary being rendered, so concurrent first downloads render once
+_render_locks = {}
+_render_locks_guard = threading.Lock()
+
+SUMMARY_PROMPT = """
+        Please summarize the following text from a PDF document.
+        Focus on the most important topics and key points.
+        Organize the summary in a clear, structured format with headings and bullet points where appropriate.
+
+        TEXT:
+        {text}
+        """
+
+# Map step of chunked summarization: one prompt per part of a long document
+SUMMARY_CHUNK_PROMPT = """
+        The following text is part {part} of {parts} of a longer PDF document.
+        Summarize the most important topics and key points of this part.
+        Use concise bullet points and keep names, definitions and figures that matter.
+
+        TEXT:
+        {text}
+        """
+
+# Reduce step of chunked summarization: combine the partial summaries
+SUMMARY_REDUCE_PROMPT = """
+        The following are summaries of consecutive parts of one PDF document.
+        Combine them into a single summary of the whole document.
+        Focus on the most important topics and key points, and remove repetition.
+        Organize the summary in a clear, structured format with headings and bullet points where appropriate.
+
+        PART SUMMARIES:
+        {text}
+        """
+
+# Process pool shared by all requests of this worker, created on first use
+_extraction_pool = None
+_extraction_pool_lock = threading.Lock()
+
+def _pdf_reader(file):
+    """Open a PDF with PyPDF2, which is only imported once a PDF is read, not at startup."""
+    import PyPDF2
+    return PyPDF2.PdfReader(file)
+
+def _pool_context():
+    """
+    Return the multiprocessing context of the extraction pool.
+
+    Workers are not forked from the server: it runs job and request threads,
+    and a child forked while one of them holds a lock would inherit it locked.
+    With forkserver, workers are forked from a clean server process that has
+    preloaded this module; spawn is the fallback where forkserver is missing.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+class _SharedPool:
+    """The extraction process pool with the number of extractions using it.
+
+    A pool that is replaced (on a change of PDF_EXTRACTION_WORKERS, or because
+    it broke) is retired, and only shut down once its last user is done.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+        self.users = 0
+        self.retired = False
+
+    def retire(self):
+        """Stop handing out the pool; call with _extraction_pool_lock held."""
+        self.retired = True
+        if self.users == 0:
+            self.pool.shutdown(wait=False)
+
+@contextmanager
+def _use_extraction_pool(workers):
+    """Lend the shared process pool used for parallel page extraction for the duration of the block."""
+    global _extraction_pool
+    with _extraction_pool_lock:
+        shared = _extraction_pool
+        if shared is None or shared.workers != workers:
+            if shared is not None:
+                shared.retire()
+            shared = _extraction_pool = _SharedPool(workers)
+        shared.users += 1
+    try:
+        yield shared.pool
+    except BrokenProcessPool:
+        # Retire the broken pool so the next parallel extraction starts a fresh one
+        with _extraction_pool_lock:
+            if _extraction_pool is shared:
+                _extraction_pool = None
+            shared.retired = True
+        raise
+    finally:
+        with _extraction_pool_lock:
+            shared.users -= 1
+            if shared.retired and shared.users == 0:
+                shared.pool.shutdown(wait=False)
+
+def _extract_page_range(pdf_path, start, end):
+    """Extract the text of pages [start, end). Runs in a pool worker process."""
+    with open(pdf_path, 'rb') as file:
+        reader = _pdf_reader(file)
+        return [reader.pages[page_num].extract_text() for page_num in range(start, end)]
+
+def _extract_pdf_parallel(pdf_path, page_count, workers):
+    """Split the page range across the process pool and join the results in page order."""
+    step = -(-page_count // workers)
+    with _use_extraction_pool(workers) as pool:
+        futures = [
+            pool.submit(_extract_page_range, pdf_path, start, min(start + step, page_count))
+            for start in range(0, page_count, step)
+        ]
+        return PAGE_SEPARATOR.join(PAGE_SEPARATOR.join(future.result()) for future in futures)
+
+def _extraction_settings():
+    """Return (workers, page_threshold) for parallel extraction from the app config."""
+    if not has_app_context():
+        return 1, 0
+    config = current_app.config
+    return config.get('PDF_EXTRACTION_WORKERS', 1), config.get('PDF_PARALLEL_PAGE_THRESHOLD', 0)
+
+def iter_text_pages(text):
+    """Yield (page_number, text) pairs from extracted text without copying it up front."""
+    page_number = 1
+    start = 0
+    while True:
+        end = text.find(PAGE_SEPARATOR, start)
+        if end == -1:
+            yield page_number, text[start:]
+            return
+        yield page_number, text[start:end]
+        page_number += 1
+        start = end + len(PAGE_SEPARATOR)
+
+def take_prompt_text(source, max_chars=None):
+    """
+    Return at most max_chars characters of document text for a prompt.
+
+    Args:
+        source: Extracted text, or an iterable of (page_number, text) pairs such as
+            iter_text_pages(); pages are only read until the budget is filled
+        max_chars (int): Character budget, PROMPT_CHAR_BUDGET from the config by default
+
+    Returns:
+        str: The document text, truncated to the budget
+    """
+    if max_chars is None:
+        max_chars = get_prompt_char_budget()
+
+    if isinstance(source, str):
+        return source[:max_chars]
+
+    parts = []
+    remaining = max_chars
+    for _page_number, page_text in source:
+        if parts:
+            if remaining <= len(PAGE_SEPARATOR):
+                break
+            parts.append(PAGE_SEPARATOR)
+            remaining -= len(PAGE_SEPARATOR)
+        parts.append(page_text[:remaining])
+        remaining -= len(parts[-1])
+        if remaining <= 0:
+            break
+    return "".join(parts)
+
+def _pack_text(pieces, separator, max_chars, finer_separators):
+    """Greedily pack pieces into chunks of at most max_chars, splitting oversized pieces further."""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        if buffer and size + len(separator) + len(piece) <= max_chars:
+            buffer.append(piece)
+            size += len(separator) + len(piece)
+            continue
+        if buffer:
+            yield separator.join(buffer)
+            buffer, size = [], 0
+        if len(piece) <= max_chars:
+            buffer, size = [piece], len(piece)
+        elif finer_separators:
+            yield from _pack_text(piece.split(finer_separators[0]), finer_separators[0], max_chars, finer_separators[1:])
+        else:
+            for start in range(0, len(piece), max_chars):
+                yield piece[start:start + max_chars]
+    if buffer:
+        yield separator.join(buffer)
+
+def iter_text_chunks(source, max_chars):
+    """
+    Split document text into chunks for separate prompts.
+
+    Pages are kept together where they fit; longer pages are split on blank
+    lines (sections), then on lines, and only then at max_chars.
+
+    Args:
+        source: Extracted text, or an iterable of (page_number, text) pairs
+        max_chars (int): Maximum chunk length
+
+    Yields:
+        str: Non-blank chunks of at most max_chars characters, in document order
+    """
+    pages = iter_text_pages(source) if isinstance(source, str) else source
+    page_texts = (page_text for _page_number, page_text in pages)
+    for chunk in _pack_text(page_texts, PAGE_SEPARATOR, max_chars, ("\n\n", "\n")):
+        if chunk.strip():
+            yield chunk
+
+def get_prompt_char_budget():
+    """Return the number of document characters allowed in one prompt."""
+    if has_app_context():
+        return current_app.config.get('PROMPT_CHAR_BUDGET', DEFAULT_PROMPT_CHAR_BUDGET)
+    return DEFAULT_PROMPT_CHAR_BUDGET
+
+def _extract_pdf(pdf_path):
+    """Extract text from a PDF file, returning (text, page_count). Raises on failure."""
+    workers, page_threshold = _extraction_settings()
+    with open(pdf_path, 'rb') as file:
+        reader = _pdf_reader(file)
+        page_count = len(reader.pages)
+
+        # Large documents are split across worker processes; small ones stay serial
+        if workers > 1 and page_count >= page_threshold:
+            try:
+                return _extract_pdf_parallel(pdf_path, page_count, workers), page_count
+            except (OSError, BrokenProcessPool) as e:
+                # Process pools are unavailable on some hosts (e.g. no /dev/shm)
+                print(f"Parallel extraction failed, falling back to serial: {e}")
+
+        text = PAGE_SEPARATOR.join(reader.pages[page_num].extract_text() for page_num in range(page_count))
+    return text, page_count
 
 def extract_text_from_pdf(pdf_path):
     """Extract text from a PDF file."""
-    text = ""
     try:
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            for page_num in range(len(reader.pages)):
-                page = reader.pages[page_num]
-                text += page.extract_text()
+        text, _page_count = _extract_pdf(pdf_path)
         return text
     except Exception as e:
         print(f"Error extracting text from PDF: {e}")
         return ""
 
-def create_pdf_summary(pdf_text):
-    """Generate a summary of the PDF content using Gemini API."""
-    import google.generativeai as genai
-    import os
+def get_extraction_cache():
+    """Return the on-disk cache of extracted PDF text."""
+    config = current_app.config
+    return get_cache(
+        'extraction',
+        config['EXTRACTION_CACHE_DIR'],
+        max_bytes=config.get('EXTRACTION_CACHE_MAX_BYTES', 0),
+        max_age=config.get('EXTRACTION_CACHE_MAX_AGE', 0),
+        suffix='.json'
+    )
 
-    # Get API key from environment variable
-    api_key = os.environ.get('GEMINI_API_KEY')
-    if not api_key:
-        api_key = current_app.config.get('GEMINI_API_KEY')
+def extract_text_cached(pdf_path, content_hash=None):
+    """
+    Extract text from a PDF file, reusing earlier results for identical uploads.
 
-    # Remove quotes if present
-    if api_key and api_key.startswith("'") and api_key.endswith("'"):
-        api_key = api_key[1:-1]
+    Args:
+        pdf_path (str): Path of the uploaded PDF
+        content_hash (str): SHA-256 of the file contents, computed if not given
 
-    # Configure the Gemini API
-    genai.configure(api_key=api_key)
+    Returns:
+        tuple: (text, page_count); ("", 0) if the PDF could not be read
+    """
+    if content_hash is None:
+        content_hash = hash_file(pdf_path)
+
+    cache = get_extraction_cache()
+    cached = cache.get_json(content_hash)
+    if cached is not None and cached.get('version') == EXTRACTION_FORMAT_VERSION:
+        current_app.logger.info(f"Extraction cache hit for {content_hash[:12]}")
+        return cached['text'], cached['page_count']
 
     try:
-        # Set up the model
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        with timed('extraction'):
+            text, page_count = _extract_pdf(pdf_path)
+    except Exception as e:
+        print(f"Error extracting text from PDF: {e}")
+        return "", 0
 
-        # Generate the summary
-        prompt = f"""
-        Please summarize the following text from a PDF document.
-        Focus on the most important topics and key points.
-        Organize the summary in a clear, structured format with headings and bullet points where appropriate.
+    try:
+        cache.set_json(content_hash, {
+            'version': EXTRACTION_FORMAT_VERSION,
+            'text': text,
+            'page_count': page_count
+        })
+    except OSError as e:
+        current_app.logger.warning(f"Could not write extraction cache entry: {e}")
 
-        TEXT:
-        {pdf_text[:100000]}  # Limiting text length to avoid token limits
-        """
+    return text, page_count
+
+def _summary_cache_key(pdf_text):
+    """Return the response cache key of a summary, or None if the text is not a string."""
+    if not isinstance(pdf_text, str):
+        return None
+    config = current_app.config
+    return llm_cache_key('summary', pdf_text, model_identifier(), SUMMARY_PROMPT_VERSION, {
+        'budget': get_prompt_char_budget(),
+        'map_reduce': config.get('SUMMARY_MAP_REDUCE', True),
+        'chunk_chars': config.get('SUMMARY_CHUNK_CHARS', 30000),
+        'max_chunks': config.get('SUMMARY_MAX_CHUNKS', 40),
+    })
+
+def create_pdf_summary(pdf_text, use_cache=True):
+    """
+    Generate a summary of the PDF content using Gemini API.
 
-        response = model.generate_content(prompt)
+    Args:
+        pdf_text: Extracted text, or an iterable of (page_number, text) pairs which
+            is read lazily up to the prompt budget
+        use_cache (bool): Reuse an earlier summary of the same text; pass False to
+            force a fresh one. Only text given as a string is cached.
+    """
+    # Identical text and settings give an identical summary; skip the model call
+    cache_key = _summary_cache_key(pdf_text)
+    if cache_key and use_cache:
+        cached = get_cached_response(cache_key)
+        if cached is not None:
+            return cached
 
-        return response.text
+    try:
+        client = get_llm_client()
+        summary = client.generate(_build_summary_prompt(client, pdf_text))
     except Exception as e:
         print(f"Error generating summary: {e}")
         return f"Error generating summary: {str(e)}"
 
-def generate_summary_pdf(summary_text, original_filename):
-    """Generate a PDF with the summary."""
-    # Create a unique filename for the summary PDF
-    summary_filename = f"summary_{uuid.uuid4()}_{original_filename}"
-    summary_path = os.path.join(current_app.config['UPLOAD_FOLDER'], summary_filename)
-
-    # Create the PDF
-    doc = SimpleDocTemplate(
-        summary_path,
-        pagesize=letter,
-        rightMargin=72, leftMargin=72,
-        topMargin=72, bottomMargin=18
+    if cache_key:
+        store_response(cache_key, summary)
+    return summary
+
+def stream_pdf_summary(pdf_text, use_cache=True):
+    """
+    Generate a summary like create_pdf_summary, yielding the text as the model produces it.
+
+    Long documents are first summarized chunk by chunk; only the final pass is
+    streamed. The complete summary is cached once the stream has finished.
+
+    Yields:
+        str: Consecutive pieces of the summary
+
+    Raises:
+        Exception: Whatever the model call raised; nothing is cached in that case
+    """
+    cache_key = _summary_cache_key(pdf_text)
+    if cache_key and use_cache:
+        cached = get_cached_response(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    client = get_llm_client()
+    pieces = []
+    for piece in client.generate_stream(_build_summary_prompt(client, pdf_text)):
+        pieces.append(piece)
+        yield piece
+
+    if cache_key:
+        store_response(cache_key, "".join(pieces))
+
+def _build_summary_prompt(client, pdf_text):
+    """
+    Return the prompt that produces the final summary.
+
+    Text within the budget is summarized with a single prompt. Longer text is
+    summarized chunk by chunk first and the prompt combines the partial summaries.
+    """
+    config = current_app.config
+    budget = get_prompt_char_budget()
+
+    # Short documents (or chunking disabled): one prompt, limited to the budget
+    if not config.get('SUMMARY_MAP_REDUCE', True) or (isinstance(pdf_text, str) and len(pdf_text) <= budget):
+        return SUMMARY_PROMPT.format(text=take_prompt_text(pdf_text, budget))
+
+    max_chunks = config.get('SUMMARY_MAX_CHUNKS', 40)
+    chunks = list(itertools.islice(iter_text_chunks(pdf_text, config.get('SUMMARY_CHUNK_CHARS', 30000)), max_chunks + 1))
+    if len(chunks) > max_chunks:
+        current_app.logger.warning(f"Document exceeds {max_chunks} summary chunks; summarizing only the first {max_chunks}")
+        chunks = chunks[:max_chunks]
+
+    if sum(len(chunk) for chunk in chunks) <= budget:
+        return SUMMARY_PROMPT.format(text=PAGE_SEPARATOR.join(chunks))
+
+    return _map_reduce_prompt(client, chunks, budget, config.get('SUMMARY_MAP_CONCURRENCY', 4))
+
+def _map_reduce_prompt(client, chunks, budget, concurrency):
+    """Summarize chunks concurrently and return the prompt combining the partial summaries."""
+    def summarize_chunk(numbered_chunk):
+        part, chunk = numbered_chunk
+        prompt = SUMMARY_CHUNK_PROMPT.format(part=part, parts=len(chunks), text=chunk)
+        return client.generate(prompt)
+
+    def reduce_group(group):
+        return client.generate(SUMMARY_REDUCE_PROMPT.format(text=group))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(chunks)))) as executor:
+        partials = list(executor.map(summarize_chunk, enumerate(chunks, start=1)))
+
+        # Merge groups of partial summaries until they fit into one reduce prompt
+        while True:
+            groups = list(_pack_text(partials, "\n\n", budget, ()))
+            if len(groups) == 1:
+                return SUMMARY_REDUCE_PROMPT.format(text=groups[0])
+            if len(groups) >= len(partials):
+                # Partial summaries are too long to merge any further; keep what fits
+                return SUMMARY_REDUCE_PROMPT.format(text=take_prompt_text("\n\n".join(partials), budget))
+            partials = list(executor.map(reduce_group, groups))
+
+def _summary_pdf_key(summary_text, original_filename):
+    """Return the cache key of a rendered summary; the title includes the file name."""
+    key = {
+        'summary': hashlib.sha256(summary_text.encode('utf-8')).hexdigest(),
+        'filename': original_filename,
+        'version': SUMMARY_PDF_FORMAT_VERSION,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+def get_summary_pdf_cache():
+    """Return the on-disk cache of rendered summary PDFs."""
+    config = current_app.config
+    return get_cache(
+        'summary_pdf',
+        config['SUMMARY_PDF_CACHE_DIR'],
+        max_bytes=config.get('SUMMARY_PDF_CACHE_MAX_BYTES', 0),
+        max_age=config.get('SUMMARY_PDF_CACHE_MAX_AGE', 0),
+        suffix='.pdf'
     )
 
-    styles = getSampleStyleSheet()
-    # Check if the style already exists
-    if 'Heading1Custom' not in styles:
-        styles.add(ParagraphStyle(
-            name='Heading1Custom',
-            fontSize=16,
-            spaceAfter=12
-        ))
-
-    # Create the content
-    content = []
-
-    # Add title
-    title = f"Summary of {original_filename}"
-    content.append(Paragraph(title, styles['Heading1Custom'] if 'Heading1Custom' in styles else styles['Heading1']))
-    content.append(Spacer(1, 0.25*inch))
-
-    # Add summary text
-    # Split by lines to handle formatting
-    for line in summary_text.split('\n'):
-        if line.strip():
-            if line.startswith('#'):  # Handle markdown headings
-                content.append(Paragraph(line.replace('#', '').strip(), styles['Heading1Custom'] if 'Heading1Custom' in styles else styles['Heading1']))
-            elif line.startswith('-') or line.startswith('*'):  # Handle bullet points
-                content.append(Paragraph(f"• {line[1:].strip()}", styles['Normal']))
-            else:
-                content.append(Paragraph(line, styles['Normal']))
-            content.append(Spacer(1, 0.1*inch))
-
-    # Build the PDF
-    doc.build(content)
-
-    return summary_path
+@contextmanager
+def _render_lock(key):
+    """Hold the lock for rendering key; the lock is dropped once nobody waits for it."""
+    with _render_locks_guard:
+        entry = _render_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _render_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _render_locks[key]
+
+def get_summary_pdf(summary_text, original_filename):
+    """
+    Return the rendered summary PDF, rendering it on first use.
+
+    Concurrent first requests for the same summary wait for a single render
+    instead of each rendering it.
+
+    Args:
+        summary_text (str): The summary in markdown
+        original_filename (str): Name of the uploaded PDF, used in the title
+
+    Returns:
+        tuple: (path of the cached PDF, cache key usable as an ETag)
+    """
+    cache = get_summary_pdf_cache()
+    key = _summary_pdf_key(summary_text, original_filename)
+    path = cache.get_path(key)
+    if path:
+        return path, key
+
+    with _render_lock(key):
+        # Another request may have rendered it while we waited
+        path = cache.get_path(key)
+        if path is None:
+            path = cache.set_bytes(key, render_summary_pdf(summary_text, original_filename))
+    return path, key
+
+def render_summary_pdf(summary_text, original_filename):
+    """Render the summary as a PDF and return its bytes."""
+    # ReportLab is only imported once a summary is rendered, not at startup
+    from app.utils.summary_renderer import get_summary_renderer
+
+    buffer = io.BytesIO()
+    with timed('pdf_render'):
+        get_summary_renderer().render(summary_text, buffer, title=f"Summary of {original_filename}")
+    return buffer.getvalue()
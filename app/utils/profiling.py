@@ -0,0 +1,188 @@
+import io
+import os
+import hmac
+import time
+import uuid
+import pstats
+import cProfile
+from urllib.parse import parse_qs
+from flask import current_app, request, jsonify, send_file, abort, Response
+from werkzeug.exceptions import HTTPException
+from werkzeug.utils import secure_filename
+
+PROFILE_SUFFIX = '.prof'
+
+# Header and query parameter that ask for a profile; their value must be PROFILING_TOKEN
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = 'profile'
+
+
+def _token_matches(config, value):
+    token = config.get('PROFILING_TOKEN')
+    return bool(token and value) and hmac.compare_digest(value, token)
+
+
+def list_profiles(directory):
+    """Return the saved profiles, newest first, as dicts with name, size and created_at."""
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith(PROFILE_SUFFIX)]
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in sorted(names, reverse=True):
+        try:
+            stat = os.stat(os.path.join(directory, name))
+        except FileNotFoundError:
+            continue
+        profiles.append({'name': name, 'size': stat.st_size, 'created_at': stat.st_mtime})
+    return profiles
+
+
+def _prune_profiles(directory, keep):
+    """Delete the oldest profiles so that at most keep remain."""
+    names = sorted(name for name in os.listdir(directory) if name.endswith(PROFILE_SUFFIX))
+    for name in names[:max(0, len(names) - keep)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            continue
+
+
+class _ProfiledBody:
+    """Response body whose iteration is profiled too; saves the profile once it is done."""
+
+    def __init__(self, body, profiler, save):
+        self.body = body
+        self.profiler = profiler
+        self._save = save
+        self._saved = False
+
+    def __iter__(self):
+        iterator = iter(self.body)
+        while True:
+            # Only while the body produces a chunk: the server's writes are not ours
+            self.profiler.enable()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                self.profiler.disable()
+            yield chunk
+        self.finish()
+
+    def finish(self):
+        if not self._saved:
+            self._saved = True
+            self._save()
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.finish()
+
+
+class ProfilingMiddleware:
+    """WSGI middleware that runs requests carrying the profiling token under cProfile.
+
+    The whole request is profiled, including session loading and saving and
+    the production of a streamed response body. Stats are saved as <time>-<endpoint>-<request
+    id>.prof in PROFILE_DIR, keeping the newest PROFILE_MAX_FILES, and the
+    file name is returned in the X-Profile-Id header. Other requests only pay
+    for a header lookup.
+    """
+
+    def __init__(self, app, wsgi_app):
+        self.app = app
+        self.wsgi_app = wsgi_app
+
+    def _requested(self, environ):
+        # Looking at profiles is not worth a profile of its own
+        if environ.get('PATH_INFO', '').startswith('/admin/profiles'):
+            return False
+        value = environ.get('HTTP_' + PROFILE_HEADER.upper().replace('-', '_'))
+        if value is None and PROFILE_PARAM in environ.get('QUERY_STRING', ''):
+            value = parse_qs(environ['QUERY_STRING']).get(PROFILE_PARAM, [None])[0]
+        return _token_matches(self.app.config, value)
+
+    def _profile_name(self, environ):
+        try:
+            endpoint, _args = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            endpoint = 'unknown'
+        request_id = environ.get('HTTP_X_REQUEST_ID') or uuid.uuid4().hex[:12]
+        name = secure_filename(f"{time.time():.6f}-{endpoint}-{request_id}")
+        return name + PROFILE_SUFFIX
+
+    def _save(self, profiler, name):
+        directory = self.app.config['PROFILE_DIR']
+        try:
+            os.makedirs(directory, exist_ok=True)
+            profiler.dump_stats(os.path.join(directory, name))
+            _prune_profiles(directory, self.app.config.get('PROFILE_MAX_FILES', 50))
+        except OSError as e:
+            self.app.logger.warning(f"Could not save profile {name}: {e}")
+
+    def __call__(self, environ, start_response):
+        if not self._requested(environ):
+            return self.wsgi_app(environ, start_response)
+
+        name = self._profile_name(environ)
+
+        def start_profiled_response(status, headers, exc_info=None):
+            return start_response(status, headers + [('X-Profile-Id', name)], exc_info)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            body = self.wsgi_app(environ, start_profiled_response)
+        except BaseException:
+            profiler.disable()
+            self._save(profiler, name)
+            raise
+        profiler.disable()
+        return _ProfiledBody(body, profiler, lambda: self._save(profiler, name))
+
+
+def _require_token():
+    value = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_PARAM)
+    if not _token_matches(current_app.config, value):
+        abort(404)
+
+
+def register_profiling(app):
+    """
+    Profile requests that carry PROFILING_TOKEN, and serve the saved profiles.
+
+    Only active when PROFILING_ENABLED and PROFILING_TOKEN are both set. The
+    token goes in the X-Profile header or the ?profile= query parameter, both
+    to trigger a profile and to use the admin pages:
+
+    - /admin/profiles lists the saved profiles
+    - /admin/profiles/<name> downloads one (pstats format, e.g. for snakeviz),
+      or with ?format=text shows its 40 most expensive calls
+    """
+    if not (app.config.get('PROFILING_ENABLED') and app.config.get('PROFILING_TOKEN')):
+        return
+
+    app.wsgi_app = ProfilingMiddleware(app, app.wsgi_app)
+
+    def profiles():
+        _require_token()
+        return jsonify(list_profiles(app.config['PROFILE_DIR']))
+
+    def profile(name):
+        _require_token()
+        path = os.path.join(app.config['PROFILE_DIR'], secure_filename(name))
+        if not name.endswith(PROFILE_SUFFIX) or not os.path.exists(path):
+            abort(404)
+        if request.args.get('format') == 'text':
+            output = io.StringIO()
+            pstats.Stats(path, stream=output).sort_stats('cumulative').print_stats(40)
+            return Response(output.getvalue(), mimetype='text/plain')
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=name)
+
+    app.add_url_rule('/admin/profiles', 'profiles', profiles)
+    app.add_url_rule('/admin/profiles/<name>', 'profile', profile)
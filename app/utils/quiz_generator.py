@@ -1,45 +1,130 @@
-import google.generativeai as genai
+import re
+import json
+import time
+import random
 from flask import current_app
-import os
+from app.utils.pdf_processor import take_prompt_text, get_prompt_char_budget
+from app.utils.llm_cache import llm_cache_key, get_cached_response, store_response
+from app.utils.llm_client import get_llm_client, model_identifier
+from app.utils.metrics import timed, observe_stage
 
-def generate_quiz(pdf_text, difficulty='medium', topics=None):
-    """
-    Generate quiz questions based on PDF content.
+# Bump when the quiz prompt changes, so cached quizzes are not reused
+QUIZ_PROMPT_VERSION = 2
 
-    Args:
-        pdf_text (str): The text extracted from the PDF
-        difficulty (str): The difficulty level ('easy', 'medium', 'hard')
-        topics (list): List of specific topics to focus on
+# Bump when the question bank prompt changes
+QUESTION_BANK_PROMPT_VERSION = 1
 
-    Returns:
-        list: A list of question dictionaries
+# Number of questions in a quiz
+QUESTION_COUNT = 10
+
+# Difficulty levels a quiz can be set up with; bank questions are tagged with one of them
+DIFFICULTIES = ('easy', 'medium', 'hard')
+
+# The fields of a quiz question; bank entries add 'difficulty' and 'topics'
+QUESTION_FIELDS = ('question', 'options', 'correct_answer', 'explanation')
+
+class QuestionStreamParser:
     """
-    # Get API key from environment variable
-    api_key = os.environ.get('GEMINI_API_KEY')
-    if not api_key:
-        api_key = current_app.config.get('GEMINI_API_KEY')
+    Incrementally extract the question objects of a streamed JSON array.
 
-    # Remove quotes if present
-    if api_key and api_key.startswith("'") and api_key.endswith("'"):
-        api_key = api_key[1:-1]
+    Text is fed in arbitrary pieces; every top-level object of the first JSON
+    array is returned by feed() as soon as its closing brace arrives. Each
+    character is scanned once, and only the object in progress is buffered.
+    """
 
-    # Configure the Gemini API
-    genai.configure(api_key=api_key)
+    def __init__(self):
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._in_string = False
+        self._escape = False
+        self._depth = 0
+        self._start = None
 
-    # Set up the model
-    model = genai.GenerativeModel('gemini-2.0-flash')
+    def feed(self, text):
+        """Add more response text and return the list of objects completed by it."""
+        if self.done:
+            return []
+        buffer = self._buffer + text
+        objects = []
+        i = self._pos
+        while i < len(buffer):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif not self._in_array:
+                # The array starts at the first '[' followed by an object
+                if char == '[':
+                    j = i + 1
+                    while j < len(buffer) and buffer[j].isspace():
+                        j += 1
+                    if j == len(buffer):
+                        break
+                    self._in_array = buffer[j] == '{'
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif char == '}' and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        objects.append(json.loads(buffer[self._start:i + 1]))
+                    except ValueError:
+                        pass
+                    self._start = None
+            elif char == ']' and self._depth == 0:
+                self.done = True
+                break
+            i += 1
 
+        # Drop everything before the object in progress
+        keep_from = self._start if self._start is not None else i
+        self._buffer = buffer[keep_from:]
+        self._pos = i - keep_from
+        if self._start is not None:
+            self._start = 0
+        return objects
+
+def _quiz_cache_key(pdf_text, difficulty, topics):
+    """Return the response cache key of a quiz, or None if the text is not a string."""
+    if not isinstance(pdf_text, str):
+        return None
+    return llm_cache_key('quiz', pdf_text, model_identifier(), QUIZ_PROMPT_VERSION, {
+        'difficulty': difficulty,
+        'topics': sorted(topics or []),
+        'budget': get_prompt_char_budget(),
+    })
+
+def _build_quiz_prompt(pdf_text, difficulty, topics, count=QUESTION_COUNT, exclude=None):
+    """Return the prompt asking for count questions on the document, avoiding the questions in exclude."""
     # Prepare the topics string
     topics_str = ", ".join(topics) if topics and len(topics) > 0 else "all relevant topics"
 
+    # Limit the text length to avoid token limits
+    prompt_text = take_prompt_text(pdf_text)
+
+    # Top-up requests list the questions already asked so they are not repeated
+    exclude_str = ""
+    if exclude:
+        exclude_str = "\n    Do not repeat any of these questions:\n" + "\n".join(f"    - {question}" for question in exclude) + "\n"
+
     # Generate the prompt based on difficulty and topics
-    prompt = f"""
-    Based on the following text from a PDF document, generate 10 multiple-choice questions (MCQs).
+    return f"""
+    Based on the following text from a PDF document, generate {count} multiple-choice questions (MCQs).
 
     Difficulty level: {difficulty}
 
     Topics to focus on: {topics_str}
-
+    {exclude_str}
     For each question:
     1. Create a clear, concise question
     2. Provide exactly 4 answer options (A, B, C, D)
@@ -58,54 +143,363 @@ def generate_quiz(pdf_text, difficulty='medium', topics=None):
     ]
 
     TEXT:
-    {pdf_text[:100000]}  # Limiting text length to avoid token limits
-    """
-
-    try:
-        # Generate the questions
-        response = model.generate_content(prompt)
-
-        # Parse the JSON response
-        import json
-        import re
-
-        # Clean up the response text to extract just the JSON part
-        response_text = response.text
-        # Find JSON array pattern
-        json_match = re.search(r'\[\s*\{.*\}\s*\]', response_text, re.DOTALL)
-
-        if json_match:
-            json_str = json_match.group(0)
-            questions = json.loads(json_str)
-        else:
-            # Fallback if regex doesn't work
-            # Remove any text before the first '[' and after the last ']'
-            start_idx = response_text.find('[')
-            end_idx = response_text.rfind(']') + 1
-            if start_idx != -1 and end_idx != 0:
-                json_str = response_text[start_idx:end_idx]
-                questions = json.loads(json_str)
-            else:
-                # If still can't parse, create a default structure
-                questions = []
-                for i in range(10):
-                    questions.append({
-                        "question": f"Question {i+1} (Error parsing model response)",
-                        "options": [f"A. Option A", f"B. Option B", f"C. Option C", f"D. Option D"],
-                        "correct_answer": "A. Option A",
-                        "explanation": "Error parsing model response"
-                    })
-
-        return questions
-
-    except Exception as e:
-        print(f"Error parsing quiz questions: {e}")
-        # Return a default set of questions if parsing fails
-        return [
-            {
-                "question": f"Question {i+1} (Error generating questions)",
-                "options": [f"A. Option A", f"B. Option B", f"C. Option C", f"D. Option D"],
-                "correct_answer": "A. Option A",
-                "explanation": "Error generating questions"
-            } for i in range(10)
-        ]
+    {prompt_text}
+    """
+
+class QuestionValidator:
+    """
+    Check parsed question objects against the quiz schema, repairing what can be repaired.
+
+    A valid question has a non-empty question, exactly len(letters) distinct
+    options labelled "A. ...", "B. ...", one of which is the correct answer,
+    and an explanation. Common deviations are repaired: options given as a
+    dict or without letter labels, and a correct answer given only as a letter
+    or as the option text. Anything else makes the item invalid. The patterns
+    and lookup tables are built once, when the validator is created.
+    """
+
+    def __init__(self, letters='ABCD'):
+        self.letters = letters
+        self._letter_index = {letter: i for i, letter in enumerate(letters)}
+        # "A. text", "A) text", "(A) text", "A: text" and lower-case variants
+        self._label = re.compile(r'^\(?([%s])\s*[.):]\s*' % (letters + letters.lower()))
+        # A correct answer given as a bare letter: "B", "b)", "(B)"
+        self._bare_letter = re.compile(r'^\(?([%s])\s*[.):]?$' % (letters + letters.lower()))
+
+    def _text(self, value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        return value.strip() if isinstance(value, str) else ""
+
+    def _strip_label(self, text):
+        return self._label.sub('', text, count=1).strip()
+
+    def _options(self, value):
+        if isinstance(value, dict):
+            value = list(value.values())
+        if not isinstance(value, list) or len(value) != len(self.letters):
+            return None
+        bodies = [self._strip_label(self._text(option)) for option in value]
+        if not all(bodies) or len({body.lower() for body in bodies}) != len(bodies):
+            return None
+        return [f"{letter}. {body}" for letter, body in zip(self.letters, bodies)]
+
+    def _correct_answer(self, value, options):
+        answer = self._text(value)
+        if not answer:
+            return None
+        if answer in options:
+            return answer
+
+        letter = self._bare_letter.match(answer)
+        if letter:
+            return options[self._letter_index[letter.group(1).upper()]]
+
+        # Match on the option text, with or without its label
+        body = self._strip_label(answer).lower()
+        for option in options:
+            if self._strip_label(option).lower() == body:
+                return option
+        return None
+
+    def validate(self, item):
+        """Return a repaired copy of item with only the schema's fields, or None if it is unusable."""
+        if not isinstance(item, dict):
+            return None
+        question = self._text(item.get('question'))
+        options = self._options(item.get('options'))
+        if not question or options is None:
+            return None
+        correct_answer = self._correct_answer(item.get('correct_answer', item.get('answer')), options)
+        if correct_answer is None:
+            return None
+        return {
+            "question": question,
+            "options": options,
+            "correct_answer": correct_answer,
+            "explanation": self._text(item.get('explanation'))
+        }
+
+# Shared by all quiz generation; the validator holds no per-quiz state
+QUESTION_VALIDATOR = QuestionValidator()
+
+def extract_questions(response_text):
+    """
+    Return the objects of the first JSON array of questions in a model response.
+
+    The response is scanned once, tracking brackets and strings, so prose or
+    code fences around the array and brackets inside strings are harmless.
+    Objects that are not valid JSON are skipped, and the complete objects of a
+    truncated array are still returned.
+    """
+    return QuestionStreamParser().feed(response_text)
+
+def _generate_questions(pdf_text, difficulty, topics, stream, count=QUESTION_COUNT, exclude=None):
+    """
+    Yield up to count validated, distinct questions that are not in exclude.
+
+    If the model's answer has fewer usable questions, follow-up requests ask
+    only for the missing ones, up to QUIZ_TOPUP_ATTEMPTS times.
+
+    Raises:
+        ValueError: If no usable question was produced
+        Exception: Whatever the first model call raised
+    """
+    client = get_llm_client()
+    attempts = 1 + current_app.config.get('QUIZ_TOPUP_ATTEMPTS', 2)
+    accepted = []
+    excluded = list(exclude or [])
+    seen = {question.lower() for question in excluded}
+
+    # Read once: pages given as a generator cannot be read again by a top-up request
+    with timed('prompt_build'):
+        prompt_text = take_prompt_text(pdf_text)
+
+    for attempt in range(attempts):
+        missing = count - len(accepted)
+        if missing <= 0:
+            break
+        if attempt > 0:
+            current_app.logger.info(f"Requesting {missing} more quiz questions (attempt {attempt + 1})")
+
+        with timed('prompt_build'):
+            prompt = _build_quiz_prompt(prompt_text, difficulty, topics, count=missing,
+                                        exclude=excluded + [question['question'] for question in accepted])
+        parse_seconds = 0.0
+        try:
+            pieces = client.generate_stream(prompt) if stream else [client.generate(prompt)]
+            parser = QuestionStreamParser()
+            for piece in pieces:
+                parse_start = time.perf_counter()
+                validated = [QUESTION_VALIDATOR.validate(item) for item in parser.feed(piece)]
+                parse_seconds += time.perf_counter() - parse_start
+                for question in validated:
+                    if question is None:
+                        current_app.logger.warning("Dropped an invalid quiz question from the model response")
+                        continue
+                    key = question['question'].lower()
+                    if key in seen or len(accepted) >= count:
+                        continue
+                    seen.add(key)
+                    accepted.append(question)
+                    yield question
+        except Exception as e:
+            # Keep the questions we have; without any, the failure is the caller's
+            if not accepted:
+                raise
+            current_app.logger.error(f"Error requesting more quiz questions: {e}")
+            break
+        finally:
+            observe_stage('quiz_parse', parse_seconds)
+
+    if not accepted:
+        raise ValueError("The model response contained no valid questions")
+    if len(accepted) < count:
+        current_app.logger.warning(f"Quiz has only {len(accepted)} of {count} questions")
+
+def generate_quiz_stream(pdf_text, difficulty='medium', topics=None, use_cache=True, count=QUESTION_COUNT,
+                         exclude=None):
+    """
+    Generate quiz questions like generate_quiz, yielding each one as soon as it is complete.
+
+    The model response is streamed and parsed incrementally, so the first
+    question is available long before the whole quiz has been written. The
+    complete quiz is cached once the stream has finished.
+
+    Yields:
+        dict: Question dictionaries, in order
+
+    Raises:
+        ValueError: If the model produced no usable question
+        Exception: Whatever the model call raised
+    """
+    cache_key = _quiz_cache_key(pdf_text, difficulty, topics) if count == QUESTION_COUNT and not exclude else None
+    if cache_key and use_cache:
+        cached = get_cached_response(cache_key)
+        if cached is not None:
+            yield from cached
+            return
+
+    questions = []
+    for question in _generate_questions(pdf_text, difficulty, topics, stream=True, count=count, exclude=exclude):
+        questions.append(question)
+        yield question
+
+    if cache_key and len(questions) == QUESTION_COUNT:
+        store_response(cache_key, questions)
+
+def generate_quiz(pdf_text, difficulty='medium', topics=None, use_cache=True, count=QUESTION_COUNT, exclude=None):
+    """
+    Generate quiz questions based on PDF content.
+
+    Args:
+        pdf_text: The text extracted from the PDF, or an iterable of
+            (page_number, text) pairs which is read lazily up to the prompt budget
+        difficulty (str): The difficulty level ('easy', 'medium', 'hard')
+        topics (list): List of specific topics to focus on
+        use_cache (bool): Reuse an earlier quiz for the same text and settings; pass
+            False to force new questions. Only text given as a string is cached.
+        count (int): Number of questions to ask for; only full quizzes are cached
+        exclude (list): Question texts that must not be asked again
+
+    Returns:
+        list: Up to count validated question dictionaries
+
+    Raises:
+        ValueError: If the model produced no usable question
+        Exception: Whatever the model call raised
+    """
+    # Identical text and settings give an equivalent quiz; skip the model call
+    cache_key = _quiz_cache_key(pdf_text, difficulty, topics) if count == QUESTION_COUNT and not exclude else None
+    if cache_key and use_cache:
+        cached = get_cached_response(cache_key)
+        if cached is not None:
+            return cached
+
+    questions = list(_generate_questions(pdf_text, difficulty, topics, stream=False, count=count, exclude=exclude))
+
+    # Short quizzes are not cached, so the next request tries for a full one
+    if cache_key and len(questions) == QUESTION_COUNT:
+        store_response(cache_key, questions)
+    return questions
+
+def _build_question_bank_prompt(pdf_text, size):
+    """Return the prompt asking for a bank of size questions tagged with difficulty and topic."""
+    prompt_text = take_prompt_text(pdf_text)
+    difficulties = ", ".join(DIFFICULTIES)
+
+    return f"""
+    Based on the following text from a PDF document, generate {size} multiple-choice questions (MCQs).
+
+    Cover the whole document and spread the questions evenly over the difficulty
+    levels {difficulties}. Every question must be different.
+
+    For each question:
+    1. Create a clear, concise question
+    2. Provide exactly 4 answer options (A, B, C, D)
+    3. Indicate which option is correct
+    4. Include a brief explanation of why the answer is correct
+    5. Give its difficulty level ({difficulties})
+    6. Name the topic it is about in one to three words
+
+    Format the output as a JSON array of objects with the following structure:
+    [
+      {{
+        "question": "Question text here?",
+        "options": ["A. Option A", "B. Option B", "C. Option C", "D. Option D"],
+        "correct_answer": "A. Option A",
+        "explanation": "Explanation of why Option A is correct",
+        "difficulty": "medium",
+        "topic": "Topic name"
+      }},
+      ...
+    ]
+
+    TEXT:
+    {prompt_text}
+    """
+
+def tag_question(question, difficulty, topics):
+    """Return a bank entry for a validated question: the question plus its difficulty and topics."""
+    difficulty = difficulty.strip().lower() if isinstance(difficulty, str) else ''
+    if isinstance(topics, str):
+        topics = [topics]
+    topics = [topic.strip() for topic in topics or [] if isinstance(topic, str) and topic.strip()]
+    return dict(question, difficulty=difficulty if difficulty in DIFFICULTIES else 'medium', topics=topics)
+
+def untag_question(entry):
+    """Return the quiz question of a bank entry."""
+    return {field: entry[field] for field in QUESTION_FIELDS}
+
+def question_matches(entry, difficulty, topics):
+    """
+    Check whether a bank entry fits a quiz request.
+
+    The difficulty must be the same. With topics, at least one of them must
+    appear in the entry's topics or question text (case-insensitive).
+    """
+    if entry.get('difficulty') != difficulty:
+        return False
+    if not topics:
+        return True
+    haystack = ' '.join(entry.get('topics', []) + [entry['question']]).lower()
+    return any(topic.lower() in haystack for topic in topics)
+
+def assemble_quiz(bank, difficulty='medium', topics=None, count=QUESTION_COUNT, partial=False):
+    """
+    Pick a random quiz from a question bank.
+
+    Args:
+        bank (list): Bank entries, as built by generate_question_bank()
+        difficulty (str): The difficulty level ('easy', 'medium', 'hard')
+        topics (list): Specific topics to focus on
+        count (int): Number of questions in the quiz
+        partial (bool): Return the matching entries even if there are fewer than count
+
+    Returns:
+        list: Up to count question dictionaries in random order, or None if
+            fewer than count entries of the bank match the request and partial is False
+    """
+    matching = [entry for entry in bank if question_matches(entry, difficulty, topics)]
+    if len(matching) < count and not partial:
+        return None
+    return [untag_question(entry) for entry in random.sample(matching, min(count, len(matching)))]
+
+def generate_question_bank(pdf_text, size, stream=False, use_cache=True):
+    """
+    Generate a bank of questions on the whole document, tagged with difficulty and topic.
+
+    Quizzes are assembled from the bank with assemble_quiz(), so most of them
+    need no model call. Entries are yielded as soon as they are parsed; the
+    complete bank is cached like a quiz.
+
+    Args:
+        pdf_text (str): The text extracted from the PDF
+        size (int): Number of questions to ask for
+        stream (bool): Stream the model response
+        use_cache (bool): Reuse an earlier bank for the same text
+
+    Yields:
+        dict: Bank entries, as returned by tag_question()
+
+    Raises:
+        ValueError: If the model produced no usable question
+        Exception: Whatever the model call raised
+    """
+    cache_key = None
+    if isinstance(pdf_text, str):
+        cache_key = llm_cache_key('quiz_bank', pdf_text, model_identifier(), QUESTION_BANK_PROMPT_VERSION, {
+            'size': size,
+            'budget': get_prompt_char_budget(),
+        })
+    if cache_key and use_cache:
+        cached = get_cached_response(cache_key)
+        if cached is not None:
+            yield from cached
+            return
+
+    client = get_llm_client()
+    with timed('prompt_build'):
+        prompt = _build_question_bank_prompt(pdf_text, size)
+    pieces = client.generate_stream(prompt) if stream else [client.generate(prompt)]
+    parser = QuestionStreamParser()
+    bank = []
+    seen = set()
+    parse_seconds = 0.0
+    for piece in pieces:
+        parse_start = time.perf_counter()
+        validated = [(item, QUESTION_VALIDATOR.validate(item)) for item in parser.feed(piece)]
+        parse_seconds += time.perf_counter() - parse_start
+        for item, question in validated:
+            if question is None or question['question'].lower() in seen or len(bank) >= size:
+                continue
+            seen.add(question['question'].lower())
+            entry = tag_question(question, item.get('difficulty'), item.get('topics', item.get('topic')))
+            bank.append(entry)
+            yield entry
+    observe_stage('quiz_parse', parse_seconds)
+
+    if not bank:
+        raise ValueError("The model response contained no valid questions")
+    if cache_key and len(bank) == size:
+        store_response(cache_key, bank)
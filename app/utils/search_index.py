@@ -0,0 +1,203 @@
+import re
+import math
+import threading
+from collections import Counter, OrderedDict
+from flask import current_app
+from app.utils.disk_cache import get_cache
+from app.utils.pdf_processor import iter_text_pages, iter_text_chunks
+
+# Bump when chunking, tokenizing or the stored format changes, so old indexes are rebuilt
+SEARCH_INDEX_VERSION = 1
+
+# BM25 parameters: term frequency saturation and document length normalization
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Loaded indexes kept in memory per process, most recently used last
+MEMORY_INDEXES = 8
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in into is it its of on or that the their then there
+these this to was were which with
+""".split())
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def tokenize(text):
+    """Return the lower-cased search terms of text, without stopwords and single characters."""
+    return [token for token in _TOKEN.findall(text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+def chunk_document(text, max_chars):
+    """
+    Split extracted text into search chunks of at most max_chars characters.
+
+    Chunks never span pages: short pages are one chunk, longer ones are split
+    on blank lines, then lines.
+
+    Returns:
+        list: (page_number, chunk_text) pairs in document order
+    """
+    chunks = []
+    for page_number, page_text in iter_text_pages(text):
+        for chunk in iter_text_chunks([(page_number, page_text)], max_chars):
+            chunks.append((page_number, chunk))
+    return chunks
+
+
+class BM25Index:
+    """Inverted index over the chunks of one document, ranked with Okapi BM25.
+
+    Only postings and chunk lengths are stored; the chunks themselves are
+    recomputed from the document text with chunk_document(), which is cheap
+    and deterministic.
+    """
+
+    def __init__(self, postings, lengths):
+        self.postings = postings
+        self.lengths = lengths
+        self.average_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    @classmethod
+    def build(cls, chunks):
+        """Index a list of (page_number, chunk_text) pairs."""
+        postings = {}
+        lengths = []
+        for position, (_page_number, chunk) in enumerate(chunks):
+            terms = tokenize(chunk)
+            lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                postings.setdefault(term, []).append((position, frequency))
+        return cls(postings, lengths)
+
+    def search(self, query, limit=5):
+        """
+        Rank chunks against a query.
+
+        Args:
+            query (str): Free text, e.g. a topic name
+            limit (int): Maximum number of results
+
+        Returns:
+            list: (chunk position, score) pairs with a positive score, best first
+        """
+        count = len(self.lengths)
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, frequency in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[position] / (self.average_length or 1))
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def to_dict(self):
+        return {'version': SEARCH_INDEX_VERSION, 'postings': self.postings, 'lengths': self.lengths}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Load an index written by to_dict(), or return None if it is from another version."""
+        if not data or data.get('version') != SEARCH_INDEX_VERSION:
+            return None
+        return cls(data['postings'], data['lengths'])
+
+
+def get_search_index_cache():
+    """Return the on-disk cache of document search indexes."""
+    config = current_app.config
+    return get_cache(
+        'search_index',
+        config['SEARCH_INDEX_CACHE_DIR'],
+        max_bytes=config.get('SEARCH_INDEX_CACHE_MAX_BYTES', 0),
+        max_age=config.get('SEARCH_INDEX_CACHE_MAX_AGE', 0),
+        suffix='.json'
+    )
+
+
+def get_search_index(key, text):
+    """
+    Return the chunks and BM25 index of a document, building them on first use.
+
+    Chunks and indexes are kept in memory for the most recently used
+    documents, and indexes on disk under key, so they are built once per
+    upload, not per quiz.
+
+    Args:
+        key (str): Content hash of the document's file
+        text (str): The document's extracted text
+
+    Returns:
+        tuple: (chunks, index) where chunks are (page_number, chunk_text) pairs
+    """
+    chunk_chars = current_app.config.get('SEARCH_CHUNK_CHARS', 2000)
+    cache_key = f"{key}-{chunk_chars}"
+
+    # The key is a content hash, so an index in memory is always for this text
+    with _indexes_lock:
+        entry = _indexes.get(cache_key)
+        if entry is not None:
+            _indexes.move_to_end(cache_key)
+            return entry
+
+    chunks = chunk_document(text, chunk_chars)
+    cache = get_search_index_cache()
+    index = BM25Index.from_dict(cache.get_json(cache_key))
+    if index is None or len(index.lengths) != len(chunks):
+        index = BM25Index.build(chunks)
+        try:
+            cache.set_json(cache_key, index.to_dict())
+        except OSError as e:
+            current_app.logger.warning(f"Could not write search index cache entry: {e}")
+
+    with _indexes_lock:
+        _indexes[cache_key] = (chunks, index)
+        while len(_indexes) > MEMORY_INDEXES:
+            _indexes.popitem(last=False)
+    return chunks, index
+
+
+def select_topic_text(key, text, topics):
+    """
+    Return the parts of a document that are about the given topics, for a prompt.
+
+    Each topic is searched separately and the best chunks of all topics are
+    taken in turn until TOPIC_PROMPT_CHARS is used up, so every topic is
+    represented. The chunks are returned in document order, headed by their
+    page numbers.
+
+    Args:
+        key (str): Content hash of the document's file
+        text (str): The document's extracted text
+        topics (list): Topics entered by the user
+
+    Returns:
+        str: The selected text, or None if no chunk mentions any of the topics
+    """
+    config = current_app.config
+    budget = config.get('TOPIC_PROMPT_CHARS', 24000)
+    per_topic = config.get('TOPIC_CHUNKS_PER_TOPIC', 6)
+    chunks, index = get_search_index(key, text)
+
+    rankings = [index.search(topic, limit=per_topic) for topic in topics]
+    selected = set()
+    used = 0
+    for rank in range(per_topic):
+        for ranking in rankings:
+            if rank >= len(ranking):
+                continue
+            position = ranking[rank][0]
+            size = len(chunks[position][1])
+            if position in selected or used + size > budget:
+                continue
+            selected.add(position)
+            used += size
+
+    if not selected:
+        return None
+    return "\n\n".join(f"[Page {chunks[position][0]}]\n{chunks[position][1]}" for position in sorted(selected))
@@ -0,0 +1,225 @@
+import os
+import time
+import zlib
+import pickle
+import threading
+from flask_session.base import ServerSideSessionInterface
+from app.utils.sqlite_db import connect
+
+# Sessions larger than this are compressed
+COMPRESS_THRESHOLD = 512
+
+# Markers for the stored format of a session
+_PLAIN = b'p'
+_COMPRESSED = b'z'
+
+# One fake Redis server per URL, shared by the app instances of this process
+_fake_servers = {}
+_fake_servers_lock = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    data BLOB,
+    expires REAL
+);
+CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires);
+"""
+
+
+def encode_session(data):
+    """Serialize session data as a pickle, zlib-compressed when it is large."""
+    raw = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(raw) > COMPRESS_THRESHOLD:
+        return _COMPRESSED + zlib.compress(raw, 1)
+    return _PLAIN + raw
+
+
+def decode_session(blob):
+    """Deserialize data written by encode_session(); returns None if it is unreadable."""
+    try:
+        if blob[:1] == _COMPRESSED:
+            return pickle.loads(zlib.decompress(blob[1:]))
+        if blob[:1] == _PLAIN:
+            return pickle.loads(blob[1:])
+    except (pickle.UnpicklingError, zlib.error, EOFError, ValueError):
+        pass
+    return None
+
+
+def shard_index(key, shards):
+    """Pick the shard of a session key; session IDs are random, so a checksum spreads them evenly."""
+    return zlib.crc32(key.encode('utf-8')) % shards if shards > 1 else 0
+
+
+class SQLiteSessionStore:
+    """Sessions in SQLite (WAL) files, sharded by session ID.
+
+    Each shard is a separate database file, so writes to different shards do
+    not wait for each other. Expired rows are skipped on read and deleted in
+    bulk by purge_expired() using an index on the expiry time.
+    """
+
+    def __init__(self, directory, shards=16):
+        self.paths = [os.path.join(directory, f'sessions-{shard:02d}.sqlite3') for shard in range(max(1, shards))]
+        self._local = threading.local()
+        # Writers of this process queue here instead of in SQLite's busy handler, which sleeps
+        self._write_locks = [threading.Lock() for _ in self.paths]
+        os.makedirs(directory, exist_ok=True)
+        for shard in range(len(self.paths)):
+            with self._connection(shard) as conn:
+                conn.executescript(SCHEMA)
+
+    def _connection(self, shard):
+        """Return this thread's connection to a shard, opening it on first use."""
+        conns = getattr(self._local, 'conns', None)
+        if conns is None:
+            conns = self._local.conns = {}
+        conn = conns.get(shard)
+        if conn is None:
+            conn = conns[shard] = connect(self.paths[shard])
+        return conn
+
+    def get(self, key):
+        shard = shard_index(key, len(self.paths))
+        row = self._connection(shard).execute(
+            'SELECT data FROM sessions WHERE id = ? AND expires > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _write(self, key, sql, params):
+        shard = shard_index(key, len(self.paths))
+        with self._write_locks[shard], self._connection(shard) as conn:
+            conn.execute(sql, params)
+
+    def set(self, key, value, ttl):
+        self._write(key, 'INSERT OR REPLACE INTO sessions (id, data, expires) VALUES (?, ?, ?)',
+                    (key, value, time.time() + ttl))
+
+    def delete(self, key):
+        self._write(key, 'DELETE FROM sessions WHERE id = ?', (key,))
+
+    def purge_expired(self):
+        """Delete expired sessions from every shard and return how many there were."""
+        removed = 0
+        now = time.time()
+        for shard in range(len(self.paths)):
+            with self._write_locks[shard], self._connection(shard) as conn:
+                removed += conn.execute('DELETE FROM sessions WHERE expires <= ?', (now,)).rowcount
+        return removed
+
+
+class RedisSessionStore:
+    """Sessions in one or more Redis-protocol servers, sharded by session ID.
+
+    The servers expire entries themselves. Session data is unpickled on
+    read, so the servers must only be reachable by trusted clients.
+    """
+
+    def __init__(self, clients):
+        self.clients = clients
+
+    def _client(self, key):
+        return self.clients[shard_index(key, len(self.clients))]
+
+    def get(self, key):
+        return self._client(key).get(key)
+
+    def set(self, key, value, ttl):
+        self._client(key).set(key, value, ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self._client(key).delete(key)
+
+    def purge_expired(self):
+        return 0
+
+
+class FakeRedis:
+    """In-process stand-in for the few Redis commands the session store uses.
+
+    For tests and benchmarks: select it with a fake:// session Redis URL.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+
+def _redis_client(url):
+    if url.startswith('fake://'):
+        with _fake_servers_lock:
+            return _fake_servers.setdefault(url, FakeRedis())
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("SESSION_BACKEND=redis needs the redis package (pip install redis)")
+    return redis.Redis.from_url(url)
+
+
+class ShardedSessionInterface(ServerSideSessionInterface):
+    """Flask-Session interface over a SQLiteSessionStore or RedisSessionStore.
+
+    Session data is stored as compressed pickles. Stores expire entries
+    themselves (purge_expired() reclaims the space of SQLite ones).
+    """
+
+    ttl = True
+
+    def __init__(self, app, store, key_prefix='session:', use_signer=False, permanent=True):
+        self.store = store
+        super().__init__(app, key_prefix=key_prefix, use_signer=use_signer, permanent=permanent)
+
+    def _retrieve_session_data(self, store_id):
+        blob = self.store.get(store_id)
+        return decode_session(blob) if blob is not None else None
+
+    def _delete_session(self, store_id):
+        self.store.delete(store_id)
+
+    def _upsert_session(self, session_lifetime, session, store_id):
+        self.store.set(store_id, encode_session(dict(session)), session_lifetime.total_seconds())
+
+    def purge_expired(self):
+        """Delete expired sessions and return how many there were."""
+        return self.store.purge_expired()
+
+
+def create_session_interface(app):
+    """Build the session interface selected by SESSION_BACKEND ('sqlite' or 'redis')."""
+    config = app.config
+    backend = config.get('SESSION_BACKEND', 'sqlite')
+    if backend == 'sqlite':
+        store = SQLiteSessionStore(config['SESSION_FILE_DIR'], shards=config.get('SESSION_SHARDS', 16))
+    elif backend == 'redis':
+        urls = [url.strip() for url in config['SESSION_REDIS_URL'].split(',') if url.strip()]
+        store = RedisSessionStore([_redis_client(url) for url in urls])
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+
+    return ShardedSessionInterface(
+        app, store,
+        key_prefix=config.get('SESSION_KEY_PREFIX', 'session:'),
+        use_signer=config.get('SESSION_USE_SIGNER', False),
+        permanent=config.get('SESSION_PERMANENT', True)
+    )
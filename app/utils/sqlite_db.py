@@ -0,0 +1,12 @@
+import sqlite3
+
+
+def connect(path):
+    """Open a SQLite connection set up for concurrent use by several worker processes."""
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    # WAL lets readers proceed while another worker is writing
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
@@ -0,0 +1,180 @@
+import re
+import threading
+from xml.sax.saxutils import escape
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame, Paragraph
+from reportlab.platypus.flowables import HRFlowable
+
+# Process-wide renderer, created on first use
+_renderer = None
+_renderer_lock = threading.Lock()
+
+HEADING = re.compile(r'^(#{1,6})\s*(.*?)\s*#*\s*$')
+BULLET = re.compile(r'^(\s*)([-*+]|\d+[.)])\s+(.*)$')
+RULE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+
+# Inline markup, applied to text that has already been XML-escaped. Bold italic goes
+# first: the bold and italic passes alone would nest its tags the wrong way round.
+BOLD_ITALIC = re.compile(
+    r'\*\*\*(.+?)\*\*\*|___(.+?)___|\*\*_(.+?)_\*\*|__\*(.+?)\*__|_\*\*(.+?)\*\*_|\*__(.+?)__\*'
+)
+BOLD = re.compile(r'\*\*(.+?)\*\*|__(.+?)__')
+ITALIC = re.compile(r'(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])|(?<![\w_])_(?!\s)(.+?)(?<!\s)_(?![\w_])')
+CODE = re.compile(r'`([^`]+)`')
+
+BULLET_SYMBOLS = ('•', '–', '•')
+MAX_LIST_DEPTH = 3
+
+
+def _inline(text):
+    """Convert markdown emphasis and code spans to ReportLab paragraph markup."""
+    text = escape(text)
+    # Code spans first, so emphasis markers inside them are left alone
+    spans = []
+
+    def keep_code(match):
+        spans.append(f'<font face="Courier">{match.group(1)}</font>')
+        return f'\x00{len(spans) - 1}\x00'
+
+    text = CODE.sub(keep_code, text)
+    text = BOLD_ITALIC.sub(lambda m: f'<b><i>{m.group(m.lastindex)}</i></b>', text)
+    text = BOLD.sub(lambda m: f'<b>{m.group(1) or m.group(2)}</b>', text)
+    text = ITALIC.sub(lambda m: f'<i>{m.group(1) or m.group(2)}</i>', text)
+    return re.sub('\x00(\\d+)\x00', lambda m: spans[int(m.group(1))], text)
+
+
+def _paragraph(text, style, bullet=None):
+    """Return a paragraph of markdown text, or of the plain text if its markup does not parse."""
+    try:
+        return Paragraph(_inline(text), style, bulletText=bullet)
+    except ValueError:
+        # Overlapping emphasis such as **a _b** c_ turns into tags that cross each other
+        return Paragraph(escape(text), style, bulletText=bullet)
+
+
+class SummaryRenderer:
+    """Renders markdown summaries to PDF with styles and page templates built once.
+
+    Handles headings (#, ## and ###; deeper levels render as ###), nested
+    bullet and numbered lists, bold, italic, code spans, horizontal rules and
+    paragraphs spanning several lines. Text is escaped, so <, > and & in a
+    summary are printed as written. Spacing comes from the styles' spaceAfter.
+
+    ReportLab frames keep layout state while a document is built, so builds
+    sharing the templates are serialised; rendering is CPU-bound and would
+    not run in parallel under the GIL anyway.
+    """
+
+    def __init__(self, pagesize=letter, margins=(72, 72, 72, 18)):
+        self.pagesize = pagesize
+        left, right, top, bottom = margins
+
+        base = getSampleStyleSheet()
+        self.title_style = ParagraphStyle('SummaryTitle', parent=base['Title'], fontSize=18, spaceAfter=0.25 * inch)
+        self.heading_styles = [
+            ParagraphStyle('SummaryHeading1', parent=base['Heading1'], fontSize=16, spaceBefore=6, spaceAfter=10),
+            ParagraphStyle('SummaryHeading2', parent=base['Heading2'], fontSize=13, spaceBefore=6, spaceAfter=8),
+            ParagraphStyle('SummaryHeading3', parent=base['Heading3'], fontSize=11, spaceBefore=4, spaceAfter=6),
+        ]
+        self.body_style = ParagraphStyle('SummaryBody', parent=base['Normal'], leading=14, spaceAfter=0.1 * inch)
+        self.bullet_styles = [
+            ParagraphStyle(
+                f'SummaryBullet{depth}', parent=self.body_style,
+                leftIndent=18 * (depth + 1), bulletIndent=18 * depth + 6, spaceAfter=4
+            )
+            for depth in range(MAX_LIST_DEPTH)
+        ]
+
+        frame = Frame(
+            left, bottom, pagesize[0] - left - right, pagesize[1] - top - bottom,
+            leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0, id='body'
+        )
+        self._page_templates = [PageTemplate(id='summary', frames=[frame], pagesize=pagesize)]
+        self._build_lock = threading.Lock()
+
+    def _list_depth(self, indent, stack):
+        """Return the nesting depth of a list item from its indentation."""
+        width = len(indent.expandtabs(4))
+        while stack and width < stack[-1]:
+            stack.pop()
+        if not stack or width > stack[-1]:
+            stack.append(width)
+        return min(len(stack), MAX_LIST_DEPTH) - 1
+
+    def flowables(self, summary_text, title=None):
+        """Convert a markdown summary to a list of flowables."""
+        content = []
+        if title:
+            content.append(Paragraph(escape(title), self.title_style))
+
+        # Lines of the paragraph or list item being collected, with its style and bullet
+        block = []
+        block_style = self.body_style
+        block_bullet = None
+        indents = []
+
+        def flush():
+            if block:
+                content.append(_paragraph(' '.join(block), block_style, block_bullet))
+                block.clear()
+
+        for line in summary_text.splitlines():
+            if not line.strip():
+                flush()
+                indents.clear()
+                continue
+
+            if RULE.match(line):
+                flush()
+                content.append(HRFlowable(width='100%', thickness=0.5, spaceBefore=4, spaceAfter=8))
+                continue
+
+            heading = HEADING.match(line)
+            if heading:
+                flush()
+                # A heading marker without text adds nothing
+                if heading.group(2):
+                    level = min(len(heading.group(1)), len(self.heading_styles)) - 1
+                    content.append(_paragraph(heading.group(2), self.heading_styles[level]))
+                continue
+
+            bullet = BULLET.match(line)
+            if bullet:
+                flush()
+                indent, marker, text = bullet.groups()
+                depth = self._list_depth(indent, indents)
+                block_style = self.bullet_styles[depth]
+                block_bullet = marker if marker[0].isdigit() else BULLET_SYMBOLS[depth]
+                block.append(text)
+                continue
+
+            # An indented line continues the current list item; anything else is body text
+            if not (indents and block and line[:1].isspace()):
+                if indents or not block:
+                    flush()
+                    indents.clear()
+                    block_style, block_bullet = self.body_style, None
+            block.append(line.strip())
+        flush()
+        return content
+
+    def render(self, summary_text, output, title=None):
+        """Render a markdown summary to output, a file name or writable binary file."""
+        content = self.flowables(summary_text, title)
+        with self._build_lock:
+            doc = BaseDocTemplate(output, pagesize=self.pagesize, pageTemplates=self._page_templates,
+                                  title=title or '')
+            doc.build(content)
+
+
+def get_summary_renderer():
+    """Return the process-wide summary renderer."""
+    global _renderer
+    if _renderer is not None:
+        return _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = SummaryRenderer()
+        return _renderer
@@ -0,0 +1,44 @@
+import os
+import hashlib
+import tempfile
+from app.utils.disk_cache import HASH_CHUNK_SIZE
+from app.utils.document_store import get_document_store
+
+
+def blob_path(directory, content_hash):
+    """Return the content-addressed path of an uploaded PDF."""
+    return os.path.join(directory, content_hash[:2], content_hash + '.pdf')
+
+
+def save_upload(file, directory):
+    """
+    Stream an uploaded file to disk, hashing it in the same pass, and store it by content.
+
+    A file that was uploaded before is not stored again: the new upload adds a
+    reference to the existing blob, along with its extracted text.
+
+    Args:
+        file: The werkzeug FileStorage of the upload
+        directory (str): Upload folder holding the content-addressed files
+
+    Returns:
+        dict: The blob row (content_hash, path, size, refcount, page_count, text)
+    """
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: file.stream.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+
+        content_hash = digest.hexdigest()
+        return get_document_store().acquire_blob(content_hash, blob_path(directory, content_hash), size, tmp_path)
+    finally:
+        # Left behind when the file was a duplicate, or on failure
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
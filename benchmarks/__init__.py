@@ -0,0 +1 @@
+# Benchmarks for the document pipeline; see benchmarks/common.py for the result format
@@ -0,0 +1,177 @@
+"""Latency of Google logins under concurrent users, against a local stub OAuth server.
+
+The stub server answers the token and userinfo endpoints after a simulated
+latency, and fails a given fraction of userinfo calls with HTTP 503 to
+exercise the retries. Each simulated user completes /auth/google-callback
+repeatedly, which exchanges the code and fetches the user's profile through
+the shared HTTP session. The same two calls are also timed with plain
+requests.post/requests.get, which open a new connection per call.
+
+Usage:
+    python -m benchmarks.bench_login [--output results.json] [--repeat 3] [--quick]
+"""
+import json
+import time
+import random
+import logging
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.common import argument_parser, create_benchmark_app, result, summarize_timings, write_results
+
+from app.utils.google_auth import get_google_auth
+from app.utils.http_client import get_http_session
+
+
+class StubOAuthHandler(BaseHTTPRequestHandler):
+    """Google's token and userinfo endpoints, answering with canned JSON."""
+
+    # Keep-alive, so pooled clients can reuse their connections, and no
+    # Nagle delays between the pieces of a response on a reused connection
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.latency)
+        if self.path != '/token':
+            return self._reply(404, {'error': 'not_found'})
+        self._reply(200, {'access_token': 'stub-access-token', 'id_token': 'stub-id-token', 'expires_in': 3600})
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        if self.path != '/userinfo':
+            return self._reply(404, {'error': 'not_found'})
+        if self.server.random.random() < self.server.error_rate:
+            return self._reply(503, {'error': 'unavailable'})
+        self._reply(200, {'sub': '1234', 'email': 'user@example.com', 'name': 'Benchmark User'})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(latency, error_rate):
+    """Start the stub OAuth server on a free local port and return it."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOAuthHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.random = random.Random(0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_logins(app, users, logins_per_user):
+    """Log in from `users` threads at once and return the per-login latencies and elapsed seconds."""
+    latencies = []
+    errors = []
+    start_barrier = threading.Barrier(users + 1)
+
+    def log_in_repeatedly():
+        client = app.test_client()
+        start_barrier.wait()
+        for _ in range(logins_per_user):
+            with client.session_transaction() as session:
+                session.clear()
+                session['oauth_state'] = 'bench-state'
+            start = time.perf_counter()
+            client.get('/auth/google-callback?code=bench-code&state=bench-state')
+            latencies.append(time.perf_counter() - start)
+            with client.session_transaction() as session:
+                if 'user' not in session:
+                    errors.append(session.get('_flashes'))
+
+    threads = [threading.Thread(target=log_in_repeatedly) for _ in range(users)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise RuntimeError(f"{len(errors)} logins failed, e.g. {errors[0]}")
+    return latencies, elapsed
+
+
+def bench_callback(app, users, logins_per_user, repeat):
+    latencies = []
+    elapsed = []
+    for _ in range(repeat):
+        run_latencies, run_elapsed = run_logins(app, users, logins_per_user)
+        latencies.extend(run_latencies)
+        elapsed.append(run_elapsed)
+    logins = users * logins_per_user
+    return result('google_callback_concurrent', summarize_timings(latencies), users=users, logins=logins,
+                  logins_per_second=logins / summarize_timings(elapsed)['median'])
+
+
+def bench_exchange(app, base_url, calls):
+    """Time the token exchange and userinfo calls, pooled and with a new connection per call."""
+    import requests
+
+    with app.app_context():
+        session = get_http_session()
+
+    def exchange(post, get):
+        start = time.perf_counter()
+        post(f"{base_url}/token", data={'code': 'bench-code'}, timeout=5).json()
+        get(f"{base_url}/userinfo", headers={'Authorization': 'Bearer stub-access-token'}, timeout=5)
+        return time.perf_counter() - start
+
+    results = []
+    for label, post, get in (('requests', requests.post, requests.get), ('pooled', session.post, session.get)):
+        timings = [exchange(post, get) for _ in range(calls)]
+        results.append(result('oauth_exchange', summarize_timings(timings), client=label, calls=calls))
+    return results
+
+
+def main():
+    parser = argument_parser(__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=16, help='Concurrent users (default: 16)')
+    parser.add_argument('--logins', type=int, default=20, help='Logins per user (default: 20)')
+    parser.add_argument('--server-latency', type=float, default=0.005,
+                        help='Seconds the stub server takes per call (default: 0.005)')
+    parser.add_argument('--error-rate', type=float, default=0.05,
+                        help='Fraction of userinfo calls failing with HTTP 503 (default: 0.05)')
+    args = parser.parse_args()
+
+    # The app logs to stdout, which carries the JSON results
+    logging.disable(logging.INFO)
+
+    repeat = 1 if args.quick else args.repeat
+    users = 4 if args.quick else args.users
+    logins = 5 if args.quick else args.logins
+
+    server = start_stub_server(args.server_latency, args.error_rate)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with tempfile.TemporaryDirectory(prefix='pdf_quiz_bench_') as workdir:
+            app = create_benchmark_app(workdir, GOOGLE_CLIENT_ID='bench-client', GOOGLE_CLIENT_SECRET='bench-secret',
+                                       HTTP_RETRY_BACKOFF=0.01, JANITOR_INTERVAL=0)
+            app.config['SESSION_COOKIE_SECURE'] = False
+            with app.app_context():
+                google_auth = get_google_auth()
+            google_auth.TOKEN_URL = f"{base_url}/token"
+            google_auth.USERINFO_URL = f"{base_url}/userinfo"
+
+            results = [bench_callback(app, users, logins, repeat)]
+            # Without failures, so both clients make the same calls
+            server.error_rate = 0.0
+            results.extend(bench_exchange(app, base_url, 20 if args.quick else 200))
+    finally:
+        server.shutdown()
+    write_results('login', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
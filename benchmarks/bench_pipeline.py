@@ -0,0 +1,286 @@
+"""Benchmarks for the hot paths of the document pipeline.
+
+Covers PDF text extraction, summary PDF rendering, quiz response parsing,
+topic search and session serialization. Nothing here calls Gemini: model responses come
+from a fixed in-process backend.
+
+Usage:
+    python -m benchmarks.bench_pipeline [--output results.json] [--repeat 5] [--quick]
+"""
+import os
+import json
+import random
+import logging
+import tempfile
+
+from benchmarks.common import argument_parser, create_benchmark_app, measure, result, write_results
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from app.utils import llm_client
+from app.utils.llm_backends import LLMBackend
+from app.utils.pdf_processor import extract_text_from_pdf, render_summary_pdf, take_prompt_text, PAGE_SEPARATOR
+from app.utils import search_index
+from app.utils.search_index import BM25Index, chunk_document, select_topic_text
+from app.utils.quiz_generator import generate_quiz, QuestionStreamParser
+from app.utils.session_store import encode_session, decode_session
+
+WORDS = (
+    "analysis algorithm boundary catalyst density enzyme equilibrium function gradient "
+    "hypothesis inference kinetics lattice membrane momentum neuron oxidation photon "
+    "polymer protein quantum reaction resistance sequence spectrum synthesis theorem "
+    "thermodynamics variance velocity voltage wavelength"
+).split()
+
+
+class FixedBackend(LLMBackend):
+    """Backend that returns the same response to every prompt."""
+
+    name = 'fixed'
+
+    def __init__(self, response):
+        self.response = response
+
+    def generate(self, prompt):
+        return self.response
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def make_pdf(path, pages, seed=0):
+    """Write a PDF with the given number of pages of text-like content."""
+    rng = random.Random(seed)
+    pdf = canvas.Canvas(path, pagesize=letter)
+    for page in range(pages):
+        y = 740
+        pdf.setFont('Helvetica-Bold', 14)
+        pdf.drawString(72, y, f"Section {page + 1}: {rng.choice(WORDS).capitalize()}")
+        pdf.setFont('Helvetica', 10)
+        for _ in range(45):
+            y -= 14
+            pdf.drawString(72, y, sentence(rng))
+        pdf.showPage()
+    pdf.save()
+
+
+def make_summary(sections, seed=0):
+    """Return a markdown summary like the ones the model writes."""
+    rng = random.Random(seed)
+    lines = ["# Summary", ""]
+    for section in range(sections):
+        lines.append(f"## {section + 1}. {rng.choice(WORDS).capitalize()} and {rng.choice(WORDS)}")
+        lines.append(sentence(rng, 30))
+        for _ in range(5):
+            lines.append(f"- **{rng.choice(WORDS).capitalize()}**: {sentence(rng, 15)}")
+        lines.append("")
+    return '\n'.join(lines)
+
+
+def make_questions(count, seed=0):
+    rng = random.Random(seed)
+    questions = []
+    for i in range(count):
+        options = [f"{letter}. {sentence(rng, 4)}" for letter in 'ABCD']
+        questions.append({
+            "question": f"Question {i + 1}: {sentence(rng, 14)[:-1]}?",
+            "options": options,
+            "correct_answer": rng.choice(options),
+            "explanation": sentence(rng, 25)
+        })
+    return questions
+
+
+def quiz_responses(quick):
+    """Return (label, response text) pairs shaped like real model output."""
+    counts = [10] if quick else [10, 50]
+    responses = []
+    for count in counts:
+        body = json.dumps(make_questions(count), indent=2)
+        responses.append((f"{count}_questions", body))
+        responses.append((f"{count}_questions_fenced", f"Here is your quiz:\n```json\n{body}\n```\nGood luck!"))
+    # Chatty preamble with brackets before the array and trailing notes after it
+    body = json.dumps(make_questions(10), indent=2)
+    preamble = ' '.join(f"[note {i}] {sentence(random.Random(i))}" for i in range(200))
+    responses.append(("10_questions_noisy", f"{preamble}\n{body}\nNotes: see [1] and [2]."))
+    return responses
+
+
+def session_payloads():
+    """Return (label, dict) pairs of session contents seen in practice."""
+    rng = random.Random(0)
+    user = {
+        'uid': 'google-oauth2|1234567890',
+        'email': 'student@example.com',
+        'name': 'Example Student',
+        'picture': 'https://lh3.googleusercontent.com/a/' + 'x' * 80,
+    }
+    tokens = {
+        'access_token': 'ya29.' + 'a' * 180,
+        'id_token': 'eyJ' + 'b' * 900,
+        'expires_in': 3599,
+    }
+    answers = [{
+        'question_number': i + 1,
+        'selected_answer': 'B. Option',
+        'correct_answer': 'A. Option',
+        'is_correct': i % 2 == 0,
+    } for i in range(10)]
+
+    current = {
+        'user': user, 'tokens': tokens, 'document_id': 'f' * 32,
+        'original_filename': 'lecture_notes.pdf', 'current_question': 10, 'answers': answers,
+    }
+    # What the session held before documents moved to the document store
+    legacy = dict(current, **{
+        'pdf_text': ' '.join(sentence(rng) for _ in range(1200)),
+        'summary': make_summary(20),
+        'quiz': make_questions(10),
+    })
+    return [('current', current), ('legacy_with_document', legacy)]
+
+
+def bench_extraction(workdir, page_counts, repeat):
+    results = []
+    for pages in page_counts:
+        path = os.path.join(workdir, f"synthetic_{pages}.pdf")
+        make_pdf(path, pages)
+        runs = repeat if pages < 1000 else min(repeat, 3)
+        for mode, workers in (('serial', 1), ('parallel', os.cpu_count() or 1)):
+            if mode == 'parallel' and workers < 2:
+                continue
+            app = create_benchmark_app(workdir, PDF_EXTRACTION_WORKERS=workers, PDF_PARALLEL_PAGE_THRESHOLD=0)
+            with app.app_context():
+                stats = measure(lambda: extract_text_from_pdf(path), repeat=runs)
+            results.append(result('extract_text_from_pdf', stats, pages=pages, mode=mode, workers=workers,
+                                  file_bytes=os.path.getsize(path)))
+    return results
+
+
+def bench_summary_pdf(workdir, section_counts, repeat):
+    results = []
+    app = create_benchmark_app(workdir)
+    with app.app_context():
+        for sections in section_counts:
+            summary = make_summary(sections)
+            outputs = []
+
+            def render():
+                outputs.append(render_summary_pdf(summary, 'benchmark.pdf'))
+
+            stats = measure(render, repeat=repeat)
+            results.append(result('render_summary_pdf', stats, sections=sections, summary_chars=len(summary),
+                                  output_bytes=len(outputs[-1])))
+    return results
+
+
+def bench_quiz_parsing(workdir, quick, repeat):
+    results = []
+    app = create_benchmark_app(workdir)
+    previous_client = llm_client._client
+    try:
+        with app.app_context():
+            for label, response in quiz_responses(quick):
+                llm_client._client = llm_client.LLMClient(FixedBackend(response))
+                questions = generate_quiz("Benchmark document text.", use_cache=False)
+                stats = measure(lambda: generate_quiz("Benchmark document text.", use_cache=False),
+                                repeat=repeat * 20)
+                results.append(result('generate_quiz', stats, response=label, response_chars=len(response),
+                                      questions=len(questions)))
+
+                def parse_stream():
+                    parser = QuestionStreamParser()
+                    for start in range(0, len(response), 64):
+                        parser.feed(response[start:start + 64])
+
+                stats = measure(parse_stream, repeat=repeat * 20)
+                results.append(result('QuestionStreamParser.feed', stats, response=label,
+                                      response_chars=len(response), piece_chars=64))
+    finally:
+        llm_client._client = previous_client
+    return results
+
+
+def make_document_text(pages, seed=0):
+    """Return extracted-text-like content with one topic per page, pages separated like extraction output."""
+    rng = random.Random(seed)
+    return PAGE_SEPARATOR.join(
+        f"Section {page + 1}: {WORDS[page % len(WORDS)]}\n" + '\n'.join(sentence(rng) for _ in range(45))
+        for page in range(pages)
+    )
+
+
+def bench_topic_search(workdir, page_counts, repeat):
+    """Index build and topic selection time, and prompt size with and without topic search."""
+    results = []
+    app = create_benchmark_app(workdir)
+    with app.app_context():
+        chunk_chars = app.config['SEARCH_CHUNK_CHARS']
+        for pages in page_counts:
+            text = make_document_text(pages)
+            stats = measure(lambda: BM25Index.build(chunk_document(text, chunk_chars)), repeat=repeat)
+            results.append(result('search_index_build', stats, pages=pages, text_chars=len(text)))
+
+            topics = ['photon wavelength', 'enzyme kinetics']
+            key = f"bench{pages}"
+            select_topic_text(key, text, topics)
+            stats = measure(lambda: select_topic_text(key, text, topics), repeat=repeat * 10)
+            results.append(result('select_topic_text', stats, pages=pages, cached='memory',
+                                  prompt_chars=len(select_topic_text(key, text, topics)),
+                                  full_prompt_chars=len(take_prompt_text(text))))
+
+            def load_from_disk():
+                search_index._indexes.clear()
+                select_topic_text(key, text, topics)
+
+            stats = measure(load_from_disk, repeat=repeat)
+            results.append(result('select_topic_text', stats, pages=pages, cached='disk'))
+    return results
+
+
+def bench_session_serialization(workdir, repeat):
+    """Compare Flask-Session's msgpack serializer with the session store's compressed pickles."""
+    results = []
+    interface = create_benchmark_app(workdir, SESSION_BACKEND='filesystem').session_interface
+    formats = (
+        ('msgpack', lambda data: interface.serializer.encode(interface.session_class(data, sid='benchmark')),
+         interface.serializer.decode),
+        ('pickle_zlib', encode_session, decode_session),
+    )
+    for label, payload in session_payloads():
+        for format_name, encode, decode in formats:
+            encoded = encode(payload)
+            stats = measure(lambda: encode(payload), repeat=repeat * 100)
+            results.append(result('session_encode', stats, payload=label, format=format_name,
+                                  encoded_bytes=len(encoded)))
+            stats = measure(lambda: decode(encoded), repeat=repeat * 100)
+            results.append(result('session_decode', stats, payload=label, format=format_name,
+                                  encoded_bytes=len(encoded)))
+    return results
+
+
+def main():
+    parser = argument_parser(__doc__.splitlines()[0])
+    args = parser.parse_args()
+
+    # The app logs to stdout, which carries the JSON results
+    logging.disable(logging.INFO)
+
+    repeat = 1 if args.quick else args.repeat
+    page_counts = [10] if args.quick else [10, 100, 1000]
+    section_counts = [5] if args.quick else [5, 50, 200]
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='pdf_quiz_bench_') as workdir:
+        results += bench_extraction(workdir, page_counts, repeat)
+        results += bench_summary_pdf(workdir, section_counts, repeat)
+        results += bench_quiz_parsing(workdir, args.quick, repeat)
+        results += bench_topic_search(workdir, page_counts, repeat)
+        results += bench_session_serialization(workdir, repeat)
+    write_results('pipeline', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
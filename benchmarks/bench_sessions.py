@@ -0,0 +1,102 @@
+"""Throughput of /submit-answer under concurrent users, per session backend.
+
+Each simulated user logs in, has a stored quiz, and answers it question by
+question from its own thread. Every answer reads and rewrites the session,
+so the request rate is bound by the session store.
+
+Usage:
+    python -m benchmarks.bench_sessions [--output results.json] [--repeat 3] [--quick]
+"""
+import os
+import time
+import logging
+import tempfile
+import threading
+
+from benchmarks.common import argument_parser, create_benchmark_app, result, summarize_timings, write_results
+from benchmarks.bench_pipeline import make_questions
+
+from app.utils.document_store import get_document_store
+
+BACKENDS = (
+    ('filesystem', {'SESSION_BACKEND': 'filesystem'}),
+    ('sqlite_1_shard', {'SESSION_BACKEND': 'sqlite', 'SESSION_SHARDS': 1}),
+    ('sqlite_16_shards', {'SESSION_BACKEND': 'sqlite', 'SESSION_SHARDS': 16}),
+    ('fake_redis', {'SESSION_BACKEND': 'redis', 'SESSION_REDIS_URL': 'fake://bench'}),
+)
+
+
+def run_users(app, document_id, users, answers_per_user):
+    """Answer the quiz from `users` threads at once and return the elapsed seconds."""
+    clients = []
+    for i in range(users):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user'] = {'uid': 'bench', 'email': f'user{i}@example.com'}
+            session['document_id'] = document_id
+            session['original_filename'] = 'benchmark.pdf'
+            session['current_question'] = 0
+            session['answers'] = []
+        clients.append(client)
+
+    errors = []
+    start_barrier = threading.Barrier(users + 1)
+
+    def answer_all(client):
+        start_barrier.wait()
+        for _ in range(answers_per_user):
+            response = client.post('/submit-answer', data={'answer': 'A. Option'})
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    threads = [threading.Thread(target=answer_all, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise RuntimeError(f"{len(errors)} requests failed, e.g. HTTP {errors[0]}")
+    return elapsed
+
+
+def bench_backend(workdir, label, overrides, users, answers_per_user, repeat):
+    backend_dir = os.path.join(workdir, label)
+    app = create_benchmark_app(backend_dir, SESSION_FILE_DIR=os.path.join(backend_dir, 'sessions'),
+                               JANITOR_INTERVAL=0, **overrides)
+    app.config['SESSION_COOKIE_SECURE'] = False
+
+    with app.app_context():
+        store = get_document_store()
+        document_id = store.create_document('bench', 'benchmark.pdf', None, None, 1)
+        store.set_quiz(document_id, make_questions(answers_per_user))
+
+    timings = [run_users(app, document_id, users, answers_per_user) for _ in range(repeat)]
+    stats = summarize_timings(timings)
+    requests = users * answers_per_user
+    return result('submit_answer_concurrent', stats, backend=label, users=users, requests=requests,
+                  requests_per_second=requests / stats['median'])
+
+
+def main():
+    parser = argument_parser(__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=16, help='Concurrent users (default: 16)')
+    parser.add_argument('--answers', type=int, default=50, help='Answers per user (default: 50)')
+    args = parser.parse_args()
+
+    # The app logs to stdout, which carries the JSON results
+    logging.disable(logging.INFO)
+
+    repeat = 1 if args.quick else args.repeat
+    users = 4 if args.quick else args.users
+    answers = 10 if args.quick else args.answers
+
+    with tempfile.TemporaryDirectory(prefix='pdf_quiz_bench_') as workdir:
+        results = [bench_backend(workdir, label, overrides, users, answers, repeat) for label, overrides in BACKENDS]
+    write_results('sessions', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
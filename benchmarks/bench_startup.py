@@ -0,0 +1,108 @@
+"""Cold start of the app: import time per module, create_app() and the first requests.
+
+Each run is a fresh interpreter started with `python -X importtime`, which
+creates the app and serves / and the login page. Heavy dependencies that
+those pages do not need (ReportLab, PyPDF2, the Gemini SDK, requests) must
+not be imported on the way; --check exits with status 1 if one is.
+
+Usage:
+    python -m benchmarks.bench_startup [--output results.json] [--repeat 5] [--quick] [--check]
+"""
+import re
+import sys
+import json
+import subprocess
+
+from benchmarks.common import REPO_ROOT, argument_parser, result, summarize_timings, write_results
+
+# Imported only by the pages that use them
+LAZY_MODULES = ('reportlab', 'PyPDF2', 'google.generativeai', 'requests')
+
+# Module imports faster than this are left out of the per-module results
+MIN_MODULE_SECONDS = 0.005
+
+CHILD = f"""
+import sys, json, time, logging, tempfile
+logging.disable(logging.INFO)
+start = time.perf_counter()
+from benchmarks.common import create_benchmark_app
+with tempfile.TemporaryDirectory(prefix='pdf_quiz_bench_') as workdir:
+    app = create_benchmark_app(workdir)
+    created = time.perf_counter()
+    client = app.test_client()
+    statuses = [client.get(path).status_code for path in ('/', '/auth/login')]
+    served = time.perf_counter()
+loaded = [name for name in {LAZY_MODULES!r} if name in sys.modules]
+print('RESULT ' + json.dumps({{'create_app': created - start, 'first_requests': served - created,
+                              'statuses': statuses, 'loaded': loaded}}))
+"""
+
+# "import time:   self [us] | cumulative | imported package", nested imports indented by two spaces
+_IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+def run_child():
+    """Start the app in a fresh interpreter and return its measurements and import times."""
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD], cwd=REPO_ROOT,
+        capture_output=True, text=True
+    )
+    lines = [line for line in process.stdout.splitlines() if line.startswith('RESULT ')]
+    if process.returncode != 0 or not lines:
+        raise RuntimeError(f"App start failed:\n{process.stderr[-2000:]}")
+    measurements = json.loads(lines[-1][len('RESULT '):])
+
+    # Cumulative seconds of every module, and the total of the top-level imports
+    imports = {}
+    total = 0.0
+    for line in process.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if not match:
+            continue
+        cumulative = int(match.group(2)) / 1e6
+        imports[match.group(4)] = cumulative
+        if not match.group(3):
+            total += cumulative
+    measurements['imports'] = imports
+    measurements['import_total'] = total
+    return measurements
+
+
+def reported_modules(imports):
+    """Pick the modules worth tracking: the app's own and top-level packages that are slow to import."""
+    return sorted(
+        name for name, seconds in imports.items()
+        if name == 'app' or name.startswith('app.') or ('.' not in name and seconds >= MIN_MODULE_SECONDS)
+    )
+
+
+def main():
+    parser = argument_parser(__doc__.splitlines()[0])
+    parser.add_argument('--check', action='store_true',
+                        help='Exit with status 1 if a lazily imported dependency was imported at startup')
+    args = parser.parse_args()
+
+    repeat = 2 if args.quick else args.repeat
+    # The first run also fills the bytecode caches
+    run_child()
+    runs = [run_child() for _ in range(repeat)]
+
+    loaded = sorted({name for run in runs for name in run['loaded']})
+    results = [
+        result('create_app', summarize_timings([run['create_app'] for run in runs]), lazy_modules_loaded=loaded),
+        result('first_requests', summarize_timings([run['first_requests'] for run in runs]),
+               paths=['/', '/auth/login'], statuses=runs[-1]['statuses']),
+        result('import_total', summarize_timings([run['import_total'] for run in runs])),
+    ]
+    for name in reported_modules(runs[-1]['imports']):
+        timings = [run['imports'][name] for run in runs if name in run['imports']]
+        results.append(result('import_module', summarize_timings(timings), module=name))
+    write_results('startup', results, args.output)
+
+    if args.check and loaded:
+        print(f"Imported at startup: {', '.join(loaded)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Shared helpers for the benchmark scripts.
+
+Every script prints (or writes with --output) one JSON document:
+
+    {
+      "suite": "pipeline",
+      "timestamp": "2026-01-01T12:00:00+00:00",
+      "git_commit": "abc1234",
+      "python": "3.11.7",
+      "platform": "Linux-...",
+      "results": [
+        {"name": "extract_text_from_pdf", "params": {"pages": 100}, "unit": "s",
+         "runs": 5, "min": 0.1, "median": 0.11, "mean": 0.11, "p95": 0.12, "max": 0.12}
+      ]
+    }
+
+so results can be collected per commit and compared over time.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def summarize_timings(timings):
+    """Return min/median/mean/p95/max of a list of durations in seconds."""
+    ordered = sorted(timings)
+    return {
+        'runs': len(ordered),
+        'min': ordered[0],
+        'median': statistics.median(ordered),
+        'mean': statistics.fmean(ordered),
+        'p95': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        'max': ordered[-1],
+    }
+
+
+def measure(func, repeat=5, warmup=1):
+    """Call func warmup + repeat times and return the timing statistics of the measured calls."""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return summarize_timings(timings)
+
+
+def result(name, stats, unit='s', **params):
+    """Build one result entry."""
+    return {'name': name, 'params': params, 'unit': unit, **stats}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(suite, results, output=None):
+    """Print the results as JSON, or write them to output."""
+    document = {
+        'suite': suite,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    text = json.dumps(document, indent=2)
+    if output:
+        with open(output, 'w') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+
+
+def argument_parser(description):
+    """Return an argument parser with the options every benchmark script accepts."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--output', '-o', help='Write the JSON results to this file instead of stdout')
+    parser.add_argument('--repeat', type=int, default=5, help='Measured runs per case (default: 5)')
+    parser.add_argument('--quick', action='store_true', help='Smaller inputs and fewer runs, for a smoke test')
+    return parser
+
+
+def create_benchmark_app(workdir, **overrides):
+    """Create the Flask app with all storage under workdir and the local stub LLM backend."""
+    from config import Config
+    from app import create_app
+
+    class BenchmarkConfig(Config):
+        TESTING = True
+        UPLOAD_FOLDER = os.path.join(workdir, 'uploads')
+        DATA_FOLDER = os.path.join(workdir, 'data')
+        EXTRACTION_CACHE_DIR = os.path.join(workdir, 'data', 'cache', 'extraction')
+        LLM_CACHE_DIR = os.path.join(workdir, 'data', 'cache', 'llm')
+        SUMMARY_PDF_CACHE_DIR = os.path.join(workdir, 'data', 'cache', 'summary_pdf')
+        SEARCH_INDEX_CACHE_DIR = os.path.join(workdir, 'data', 'cache', 'search_index')
+        DOCUMENT_STORE_PATH = os.path.join(workdir, 'data', 'documents.sqlite3')
+        LLM_BACKEND = 'stub'
+        LLM_STUB_LATENCY = 0.0
+        LLM_STUB_JITTER = 0.0
+        LLM_CACHE_ENABLED = False
+        JOB_WORKERS = 0
+
+    for key, value in overrides.items():
+        setattr(BenchmarkConfig, key, value)
+    return create_app(BenchmarkConfig)
@@ -14,6 +14,7 @@ class Config:
 
     # API keys
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+    GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-2.0-flash')
 
     # Google OAuth configuration
     GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
@@ -33,12 +34,163 @@ class Config:
     # Detect environment
     VERCEL = os.environ.get('VERCEL', 'false').lower() == 'true'
 
-    # Set upload folder based on environment
+    # Set data folder based on environment
     if VERCEL:
         # On Vercel, use a subdirectory in the temp directory
-        UPLOAD_FOLDER = os.path.join(tempfile.gettempdir(), 'pdf_quiz_uploads')
-        print(f"Running on Vercel. Upload folder: {UPLOAD_FOLDER}", file=sys.stderr)
+        DATA_FOLDER = os.path.join(tempfile.gettempdir(), 'pdf_quiz_data')
+        print(f"Running on Vercel. Data folder: {DATA_FOLDER}", file=sys.stderr)
     else:
         # In development, use a local directory
-        UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app/static/uploads')
-        print(f"Running locally. Upload folder: {UPLOAD_FOLDER}", file=sys.stderr)
+        DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+        print(f"Running locally. Data folder: {DATA_FOLDER}", file=sys.stderr)
+
+    # Private application data (document store, caches); must not be web-served
+    DATA_FOLDER = os.environ.get('DATA_FOLDER') or DATA_FOLDER
+
+    # Uploaded PDFs, stored by content hash; private too, so not under app/static
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(DATA_FOLDER, 'uploads')
+
+    # Server-side session storage: 'sqlite' (SESSION_SHARDS database files in
+    # SESSION_FILE_DIR), 'redis' (SESSION_REDIS_URL; a comma-separated list shards
+    # sessions across servers, fake:// is an in-process fake) or 'filesystem'
+    # (one Flask-Session file per session). The janitor deletes expired sessions.
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'sqlite')
+    SESSION_FILE_DIR = os.environ.get('SESSION_FILE_DIR') or os.path.join(DATA_FOLDER, 'sessions')
+    SESSION_SHARDS = int(os.environ.get('SESSION_SHARDS', 16))
+    SESSION_REDIS_URL = os.environ.get('SESSION_REDIS_URL', 'redis://localhost:6379/0')
+
+    # Sessions expire after this many seconds without a request. Documents used
+    # within this time may still be open in a session and are never deleted.
+    PERMANENT_SESSION_LIFETIME = int(os.environ.get('SESSION_LIFETIME', 24 * 60 * 60))
+
+    # Upload clean-up: documents unused for UPLOAD_MAX_AGE seconds are deleted, and
+    # least recently used ones while UPLOAD_FOLDER is over UPLOAD_MAX_BYTES.
+    # The janitor runs every JANITOR_INTERVAL seconds in each worker (0 disables it)
+    # and on demand with `flask janitor`.
+    UPLOAD_MAX_AGE = int(os.environ.get('UPLOAD_MAX_AGE', 7 * 24 * 60 * 60))
+    UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', (256 if VERCEL else 2048) * 1024 * 1024))
+    JANITOR_INTERVAL = int(os.environ.get('JANITOR_INTERVAL', 15 * 60 if VERCEL else 60 * 60))
+
+    # Cache of extracted PDF text, keyed by the SHA-256 of the uploaded file
+    EXTRACTION_CACHE_DIR = os.environ.get('EXTRACTION_CACHE_DIR') or os.path.join(DATA_FOLDER, 'cache', 'extraction')
+    EXTRACTION_CACHE_MAX_BYTES = int(os.environ.get('EXTRACTION_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    EXTRACTION_CACHE_MAX_AGE = int(os.environ.get('EXTRACTION_CACHE_MAX_AGE', 7 * 24 * 60 * 60))
+
+    # Summary PDFs, rendered on first download and cached by summary hash
+    SUMMARY_PDF_CACHE_DIR = os.environ.get('SUMMARY_PDF_CACHE_DIR') or os.path.join(DATA_FOLDER, 'cache', 'summary_pdf')
+    SUMMARY_PDF_CACHE_MAX_BYTES = int(os.environ.get('SUMMARY_PDF_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+    SUMMARY_PDF_CACHE_MAX_AGE = int(os.environ.get('SUMMARY_PDF_CACHE_MAX_AGE', 7 * 24 * 60 * 60))
+
+    # Parallel text extraction: documents with at least PDF_PARALLEL_PAGE_THRESHOLD
+    # pages are split across PDF_EXTRACTION_WORKERS processes (1 disables it)
+    PDF_EXTRACTION_WORKERS = int(os.environ.get('PDF_EXTRACTION_WORKERS', min(4, os.cpu_count() or 1)))
+    PDF_PARALLEL_PAGE_THRESHOLD = int(os.environ.get('PDF_PARALLEL_PAGE_THRESHOLD', 50))
+
+    # Maximum number of document characters sent to the model in one prompt
+    PROMPT_CHAR_BUDGET = int(os.environ.get('PROMPT_CHAR_BUDGET', 100000))
+
+    # Extracted text, summaries and quizzes are kept here instead of in the session
+    DOCUMENT_STORE_PATH = os.environ.get('DOCUMENT_STORE_PATH') or os.path.join(DATA_FOLDER, 'documents.sqlite3')
+
+    # Background jobs for summary and quiz generation. JOB_WORKERS=0 runs them
+    # inline, which serverless hosts need since they freeze after the response
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 0 if VERCEL else 4))
+    JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', 600))
+    # Finished jobs, with their results, are deleted by the janitor after JOB_MAX_AGE seconds
+    JOB_MAX_AGE = int(os.environ.get('JOB_MAX_AGE', 24 * 60 * 60))
+
+    # Prometheus metrics (pipeline stage latency, model prompt/response sizes,
+    # errors) on /metrics, per worker process. Scrapers must send METRICS_TOKEN
+    # as a bearer token; without one set, /metrics answers 404.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Google accounts (comma-separated emails) allowed to see admin pages such as /cache-stats
+    ADMIN_EMAILS = [email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip()]
+
+    # Profile single requests in production: with both settings, a request with
+    # an X-Profile header (or ?profile=) equal to PROFILING_TOKEN runs under
+    # cProfile. The newest PROFILE_MAX_FILES profiles are kept in PROFILE_DIR
+    # and listed on /admin/profiles (same token).
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN')
+    PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(DATA_FOLDER, 'profiles')
+    PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 50))
+
+    # Batches of PDFs (POST /batch, `flask batch`): PDFs processed at once, how
+    # long a web batch may run (instead of JOB_TIMEOUT), and how long the inputs
+    # and results of web batches are kept
+    BATCH_FOLDER = os.environ.get('BATCH_FOLDER') or os.path.join(DATA_FOLDER, 'batches')
+    BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 4))
+    BATCH_TIMEOUT = int(os.environ.get('BATCH_TIMEOUT', 24 * 60 * 60))
+    BATCH_MAX_AGE = int(os.environ.get('BATCH_MAX_AGE', 7 * 24 * 60 * 60))
+
+    # Documents longer than PROMPT_CHAR_BUDGET are summarized in chunks of
+    # SUMMARY_CHUNK_CHARS, at most SUMMARY_MAP_CONCURRENCY at a time, and the
+    # partial summaries are then combined
+    SUMMARY_MAP_REDUCE = os.environ.get('SUMMARY_MAP_REDUCE', 'true').lower() == 'true'
+    SUMMARY_CHUNK_CHARS = int(os.environ.get('SUMMARY_CHUNK_CHARS', 30000))
+    SUMMARY_MAP_CONCURRENCY = int(os.environ.get('SUMMARY_MAP_CONCURRENCY', 4))
+    SUMMARY_MAX_CHUNKS = int(os.environ.get('SUMMARY_MAX_CHUNKS', 40))
+
+    # Cache of model responses (summaries and quizzes), keyed by document text,
+    # model, prompt version and parameters
+    LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+    LLM_CACHE_DIR = os.environ.get('LLM_CACHE_DIR') or os.path.join(DATA_FOLDER, 'cache', 'llm')
+    LLM_CACHE_MAX_BYTES = int(os.environ.get('LLM_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    LLM_CACHE_TTL = int(os.environ.get('LLM_CACHE_TTL', 7 * 24 * 60 * 60))
+
+    # Shared Gemini client: calls in flight per process, request rate (0 = no
+    # limit) with a burst allowance, per-call timeout, and how long a call may
+    # wait for a slot before failing
+    GEMINI_MAX_CONCURRENCY = int(os.environ.get('GEMINI_MAX_CONCURRENCY', 8))
+    GEMINI_REQUESTS_PER_MINUTE = int(os.environ.get('GEMINI_REQUESTS_PER_MINUTE', 0))
+    GEMINI_BURST = int(os.environ.get('GEMINI_BURST', 10))
+    GEMINI_TIMEOUT = int(os.environ.get('GEMINI_TIMEOUT', 120))
+    GEMINI_QUEUE_TIMEOUT = int(os.environ.get('GEMINI_QUEUE_TIMEOUT', 120))
+
+    # Summaries are generated by the job queue, and the page shows their text as
+    # it is written. SUMMARY_SSE=true streams them over server-sent events from
+    # the request instead, which holds a web worker for the whole model call:
+    # only enable it with async workers (e.g. gevent)
+    SUMMARY_SSE = os.environ.get('SUMMARY_SSE', 'false').lower() == 'true'
+
+    # Stream quiz generation and start the quiz as soon as the first question is parsed
+    QUIZ_STREAMING = os.environ.get('QUIZ_STREAMING', 'true').lower() == 'true'
+
+    # Follow-up requests for the questions missing after invalid ones were dropped
+    QUIZ_TOPUP_ATTEMPTS = int(os.environ.get('QUIZ_TOPUP_ATTEMPTS', 2))
+
+    # Questions generated per document with its first quiz, tagged by difficulty
+    # and topic; later quizzes are assembled from them without a model call.
+    # 0 generates every quiz with the model.
+    QUESTION_BANK_SIZE = int(os.environ.get('QUESTION_BANK_SIZE', 50))
+
+    # Quizzes on specific topics send only the best-matching parts of the
+    # document (BM25 over chunks of at most SEARCH_CHUNK_CHARS, indexed at upload):
+    # up to TOPIC_CHUNKS_PER_TOPIC chunks per topic and TOPIC_PROMPT_CHARS in total
+    TOPIC_SEARCH = os.environ.get('TOPIC_SEARCH', 'true').lower() == 'true'
+    SEARCH_CHUNK_CHARS = int(os.environ.get('SEARCH_CHUNK_CHARS', 2000))
+    TOPIC_CHUNKS_PER_TOPIC = int(os.environ.get('TOPIC_CHUNKS_PER_TOPIC', 6))
+    TOPIC_PROMPT_CHARS = int(os.environ.get('TOPIC_PROMPT_CHARS', 24000))
+    SEARCH_INDEX_CACHE_DIR = os.environ.get('SEARCH_INDEX_CACHE_DIR') or os.path.join(DATA_FOLDER, 'cache', 'search_index')
+    SEARCH_INDEX_CACHE_MAX_BYTES = int(os.environ.get('SEARCH_INDEX_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+    SEARCH_INDEX_CACHE_MAX_AGE = int(os.environ.get('SEARCH_INDEX_CACHE_MAX_AGE', 7 * 24 * 60 * 60))
+
+    # Text generation backend: 'gemini', or 'stub' for load tests and benchmarks,
+    # which answers locally with canned summaries and quizzes after a simulated
+    # latency (seconds, +/- jitter) and fails a given fraction of calls
+    LLM_BACKEND = os.environ.get('LLM_BACKEND', 'gemini').lower()
+    LLM_STUB_LATENCY = float(os.environ.get('LLM_STUB_LATENCY', 0.5))
+    LLM_STUB_JITTER = float(os.environ.get('LLM_STUB_JITTER', 0.2))
+    LLM_STUB_ERROR_RATE = float(os.environ.get('LLM_STUB_ERROR_RATE', 0.0))
+    LLM_STUB_SEED = int(os.environ.get('LLM_STUB_SEED', 0))
+
+    # Outgoing HTTP calls (Google OAuth, Firebase) share a pool of keep-alive
+    # connections; failed calls are retried HTTP_RETRIES times with exponential
+    # backoff, and connect/read timeouts are in seconds
+    HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 20))
+    HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 3))
+    HTTP_RETRY_BACKOFF = float(os.environ.get('HTTP_RETRY_BACKOFF', 0.5))
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+    HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 15))
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from app import create_app
+from config import Config
+
+
+@pytest.fixture
+def app(tmp_path):
+    # Every file the app writes goes under tmp_path instead of the data folder
+    overrides = {
+        name: str(tmp_path) + value[len(Config.DATA_FOLDER):]
+        for name, value in vars(Config).items()
+        if name.isupper() and isinstance(value, str) and value.startswith(Config.DATA_FOLDER)
+    }
+
+    class TestConfig(Config):
+        TESTING = True
+        SECRET_KEY = 'test'
+        SESSION_COOKIE_SECURE = False
+        LLM_BACKEND = 'stub'
+        JOB_WORKERS = 0
+        JANITOR_INTERVAL = 0
+        PDF_EXTRACTION_WORKERS = 1
+
+    for name, value in overrides.items():
+        setattr(TestConfig, name, value)
+    app = create_app(TestConfig)
+    app.config['SESSION_COOKIE_SECURE'] = False
+    return app
+
+
+@pytest.fixture
+def client(app):
+    """A test client logged in as user u1."""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = {'uid': 'u1', 'email': 'u1@example.com'}
+    return client
+
+
+@pytest.fixture
+def pdf_file(tmp_path):
+    """Path of a small PDF with extractable text."""
+    from reportlab.pdfgen import canvas
+
+    path = os.path.join(tmp_path, 'reading.pdf')
+    pdf = canvas.Canvas(path)
+    for page in range(2):
+        pdf.drawString(72, 720, f"Page {page + 1}: photosynthesis converts light energy into chemical energy.")
+        pdf.showPage()
+    pdf.save()
+    return path
@@ -0,0 +1,22 @@
+def test_metrics_are_not_served_without_a_token(app):
+    assert app.test_client().get('/metrics').status_code == 404
+
+
+def test_metrics_require_the_token(app):
+    app.config['METRICS_TOKEN'] = 'secret'
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert b'http_request' in response.data
+
+
+def test_cache_stats_need_an_admin(app, client):
+    assert client.get('/cache-stats').status_code == 403
+    app.config['ADMIN_EMAILS'] = ['u1@example.com']
+    assert client.get('/cache-stats').status_code == 200
+
+
+def test_cache_stats_need_a_login(app):
+    assert app.test_client().get('/cache-stats').status_code == 302
@@ -0,0 +1,38 @@
+from app.utils.jobs import get_job_queue, DONE, RUNNING
+
+
+def _create_batch(client, pdf_file):
+    with open(pdf_file, 'rb') as file:
+        response = client.post('/batch', data={'pdf_files': (file, 'reading.pdf')})
+    assert response.status_code == 202
+    return response.get_json()['batch_id']
+
+
+def _batch_job(app, batch_id):
+    from app.utils.batch import Batch, batch_directory
+    with app.app_context():
+        return Batch(batch_directory(batch_id)).manifest['job_id']
+
+
+def test_resume_is_rejected_while_the_batch_runs(app, client, pdf_file):
+    batch_id = _create_batch(client, pdf_file)
+    job_id = _batch_job(app, batch_id)
+    with app.app_context():
+        queue = get_job_queue()
+        assert queue.get(job_id)['status'] == DONE
+        # As if the job were still processing the batch in another worker
+        queue._update(job_id, status=RUNNING, finished_at=None)
+
+    response = client.post(f'/batch/{batch_id}/resume')
+    assert response.status_code == 409
+    assert _batch_job(app, batch_id) == job_id
+
+
+def test_resume_runs_a_finished_batch_again(app, client, pdf_file):
+    batch_id = _create_batch(client, pdf_file)
+    job_id = _batch_job(app, batch_id)
+
+    response = client.post(f'/batch/{batch_id}/resume')
+    assert response.status_code == 202
+    assert _batch_job(app, batch_id) != job_id
+    assert client.get(f'/batch/{batch_id}').get_json()['counts']['done'] == 1
@@ -0,0 +1,47 @@
+import time
+
+import pytest
+from flask import Flask
+
+from app.utils.jobs import JobQueue, DONE, FAILED, report_progress
+
+
+@pytest.fixture
+def queue(tmp_path):
+    app = Flask(__name__)
+    with app.app_context():
+        yield JobQueue(str(tmp_path / 'jobs.sqlite3'), max_workers=0, timeout=60)
+
+
+def _summary():
+    report_progress({'text': 'partial'})
+    return 'summary'
+
+
+def _fail():
+    raise RuntimeError('boom')
+
+
+def test_finished_job_drops_progress(queue):
+    job = queue.get(queue.submit('summary', 'user', _summary))
+    assert job['status'] == DONE
+    assert job['result'] == 'summary'
+    assert job['progress'] is None
+
+
+def test_prune_deletes_only_old_finished_jobs(queue):
+    done = queue.submit('summary', 'user', _summary)
+    failed = queue.submit('summary', 'user', _fail)
+    assert queue.get(failed)['status'] == FAILED
+    assert queue.prune(60) == 0
+
+    queue._update(done, finished_at=time.time() - 120)
+    queue._update(failed, finished_at=time.time() - 120)
+    assert queue.prune(60) == 2
+    assert queue.get(done) is None and queue.get(failed) is None
+
+
+def test_prune_deletes_timed_out_jobs(queue):
+    job_id = queue.submit('summary', 'user', _summary)
+    queue._update(job_id, status='running', started_at=time.time() - 200, finished_at=None)
+    assert queue.prune(60) == 1
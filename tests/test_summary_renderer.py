@@ -0,0 +1,28 @@
+import io
+
+import pytest
+
+from app.utils.summary_renderer import SummaryRenderer, _inline
+
+
+@pytest.mark.parametrize('text', ['***x***', '___x___', '**_x_**', '__*x*__', '_**x**_', '*__x__*'])
+def test_bold_italic_nests_tags(text):
+    assert _inline(text) == '<b><i>x</i></b>'
+
+
+def test_bold_containing_italic():
+    assert _inline('**a _b_ c**') == '<b>a <i>b</i> c</b>'
+
+
+@pytest.mark.parametrize('line', ['**a _b** c_', '_a **b_ c**', '# **a _b** c_', '- _a **b_ c**'])
+def test_mixed_emphasis_falls_back_to_plain_text(line):
+    renderer = SummaryRenderer()
+    paragraph = renderer.flowables(line)[-1]
+    assert '<' not in paragraph.text
+    renderer.render(line, io.BytesIO())
+
+
+def test_bold_italic_summary_renders():
+    output = io.BytesIO()
+    SummaryRenderer().render('# ***Key*** points\n\n- ***one***\n- two with ***three***', output)
+    assert output.getvalue().startswith(b'%PDF')